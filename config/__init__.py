@@ -0,0 +1,7 @@
+# Celery подключается только если установлен
+try:
+    from .celery import app as celery_app
+except ImportError:
+    celery_app = None
+
+__all__ = ('celery_app',)
@@ -0,0 +1,16 @@
+"""
+Celery application for config project.
+
+Celery is optional: the app is only created when the package is installed,
+and tasks are only dispatched when CELERY_BROKER_URL is configured.
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+app = Celery('config')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
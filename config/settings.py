@@ -105,4 +105,9 @@ CORRECTIONS_CONFIG = {
     'MAX_HYPOTHESES_PER_CORRECTION': 20,
     'DEFAULT_SCOPE_ID': 0,
     'AUTO_APPROVE_SCORE_THRESHOLD': 0.9,
+    # Расписания от этого размера экспортируются потоково, без сохранения стилей
+    'STREAMING_EXPORT_MIN_BYTES': 20 * 1024 * 1024,
 }
+
+# Celery (опционально): без брокера фоновые задачи выполняются синхронно
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL')
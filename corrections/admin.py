@@ -1,39 +1,148 @@
+import functools
+import json
 from django import forms
 from django.contrib import admin
 from django.urls import path, reverse
 from django.http import JsonResponse
-from django.views.decorators.http import require_POST
-from django.views.decorators.csrf import csrf_protect
+from django.views import View
+from django.template.loader import render_to_string
 from django.utils.html import format_html
-from django.contrib.admin.views.decorators import staff_member_required
+from django.utils.safestring import mark_safe
+from django.db import transaction
+from django.db.models import Count, Q
+from django.contrib.admin.views.main import ChangeList
 from .models import ContextElement, Item, Correction
 
 
 # =============== AJAX View для создания контекста ===============
-@staff_member_required
-@require_POST
-@csrf_protect
-def add_contextelement_ajax(request):
-    key = request.POST.get('key', '').strip()
-    value = request.POST.get('value', '').strip()
-    important = request.POST.get('important') == 'on'
-
-    if not key or not value:
-        return JsonResponse({'error': 'Ключ и значение обязательны.'}, status=400)
-
-    obj, created = ContextElement.objects.get_or_create(
-        key=key,
-        value=value,
-        defaults={'important': important}
+def _context_repr(obj):
+    return f"{obj.key}: {obj.value}" + (" ⭐" if obj.important else "")
+
+
+def _parse_context_items(request):
+    """
+    Разбирает запрос на элементы контекста.
+    Поддерживает форму с одним элементом (key/value/important) и JSON
+    вида {"items": [{key, value, important}, ...]}. Возвращает словарь
+    {(key, value): important} или None, если данные некорректны.
+    """
+    if request.content_type == 'application/json':
+        try:
+            payload = json.loads(request.body)
+        except ValueError:
+            return None
+        raw_items = payload.get('items') if isinstance(payload, dict) else None
+        if not isinstance(raw_items, list) or not raw_items:
+            return None
+    else:
+        raw_items = [request.POST]
+
+    items = {}
+    for entry in raw_items:
+        if not hasattr(entry, 'get'):
+            return None
+        key = entry.get('key', '')
+        value = entry.get('value', '')
+        # В JSON могут прийти числа, null, списки — принимаем только строки
+        if not isinstance(key, str) or not isinstance(value, str):
+            return None
+        key = key.strip()
+        value = value.strip()
+        if not key or not value:
+            return None
+        items[(key, value)] = entry.get('important') in (True, 'on')
+    return items
+
+
+class AddContextElementView(View):
+    """
+    Создание элементов контекста из формы Item.
+    Права доступа и CSRF проверяет admin_site.admin_view (см. ItemAdmin.get_urls).
+    """
+    http_method_names = ['post']
+
+    def post(self, request):
+        items = _parse_context_items(request)
+        if items is None:
+            return JsonResponse({'error': 'Ключ и значение обязательны.'}, status=400)
+
+        lookup = Q()
+        for key, value in items:
+            lookup |= Q(key=key, value=value)
+
+        with transaction.atomic():
+            existing = {
+                (obj.key, obj.value): obj
+                for obj in ContextElement.objects.select_for_update().filter(lookup)
+            }
+
+            to_update = []
+            for kv, important in items.items():
+                obj = existing.get(kv)
+                if obj is not None and obj.important != important:
+                    obj.important = important
+                    to_update.append(obj)
+            if to_update:
+                ContextElement.objects.bulk_update(to_update, ['important'])
+
+            to_create = [
+                ContextElement(key=key, value=value, important=important)
+                for (key, value), important in items.items()
+                if (key, value) not in existing
+            ]
+            if to_create:
+                # ignore_conflicts не возвращает id, поэтому перечитываем одним запросом
+                ContextElement.objects.bulk_create(to_create, ignore_conflicts=True)
+                existing = {
+                    (obj.key, obj.value): obj
+                    for obj in ContextElement.objects.filter(lookup)
+                }
+
+        result = [
+            {'id': existing[kv].id, 'repr': _context_repr(existing[kv])}
+            for kv in items
+        ]
+        if request.content_type == 'application/json':
+            return JsonResponse({'items': result})
+        return JsonResponse(result[0])
+
+
+@functools.lru_cache(maxsize=1)
+def _add_context_ajax_url():
+    """URL AJAX-добавления контекста; резолвится один раз за процесс"""
+    return reverse('admin:corrections_item_add_context_ajax')
+
+
+# =============== Бейджи для списков ===============
+# Различных значений немного (3 статуса, 3 диапазона оценки),
+# поэтому HTML бейджей строится один раз при импорте
+_SCORE_BADGE = (
+    '<span style="background: {color}; color: white; padding: 2px 8px; '
+    'border-radius: 8px; font-weight: bold;">{{}}</span>'
+)
+_SCORE_HTML = {
+    'hi': _SCORE_BADGE.format(color='#28a745'),
+    'mid': _SCORE_BADGE.format(color='#ffc107'),
+    'lo': _SCORE_BADGE.format(color='#dc3545'),
+}
+
+
+def _status_badge_html(text, bg, icon):
+    return format_html(
+        '<span style="background: {}; color: white; padding: 3px 8px; '
+        'border-radius: 10px; font-size: 0.85em; display: inline-flex; '
+        'align-items: center; gap: 4px; min-width: 85px; justify-content: center;">'
+        '{} {}</span>',
+        bg, icon, text
     )
-    if not created and obj.important != important:
-        obj.important = important
-        obj.save()
 
-    return JsonResponse({
-        'id': obj.id,
-        'repr': f"{obj.key}: {obj.value}" + (" ⭐" if obj.important else ""),
-    })
+
+_STATUS_HTML = {
+    Correction.STATUS_PENDING: _status_badge_html('Ожидает', '#ffcc00', '🕒'),
+    Correction.STATUS_APPROVED: _status_badge_html('Готово', '#28a745', '✅'),
+    Correction.STATUS_INVALID: _status_badge_html('Отменено', '#dc3545', '❌'),
+}
+_STATUS_UNKNOWN_HTML = _status_badge_html('—', '#6c757d', '❓')
 
 
 # =============== Форма для Item ===============
@@ -41,12 +150,9 @@ class ItemAdminForm(forms.ModelForm):
     class Meta:
         model = Item
         fields = ['value', 'score', 'approved', 'suggested_by_reviewer', 'context']
-        widgets = {
-            'context': admin.widgets.FilteredSelectMultiple("Элементы контекста", is_stacked=False),
-        }
 
     class Media:
-        js = ('admin/js/jquery.init.js',)
+        js = ('admin/js/jquery.init.js', 'js/item-add-context.js')
 
 
 # =============== Админка: Item ===============
@@ -57,6 +163,10 @@ class ItemAdmin(admin.ModelAdmin):
     list_filter = ['approved', 'suggested_by_reviewer', 'created_at']
     search_fields = ['value', 'context__key', 'context__value']
     readonly_fields = ['created_at', 'add_context_section']  # ← current_context_list удалён
+    autocomplete_fields = ['context']
+    ordering = ['-score']
+    list_per_page = 25
+    show_full_result_count = False
 
     fieldsets = (
         ('Основное значение', {
@@ -75,74 +185,14 @@ class ItemAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('context')
+
     def add_context_section(self, obj):
-        ajax_url = reverse('admin:corrections_item_add_context_ajax')
-        return format_html(
-            '''
-            <div style="margin-top: 8px;">
-                <input type="text" id="id_new_context_key" placeholder="Ключ" style="width: 120px; margin-right: 8px;">
-                <input type="text" id="id_new_context_value" placeholder="Значение" style="width: 160px; margin-right: 8px;">
-                <label style="display: inline-flex; align-items: center; gap: 4px; cursor: pointer;">
-                    <input type="checkbox" id="id_new_context_important"> ⭐ Важный
-                </label>
-                <button type="button" id="add-context-btn" class="button"
-                        style="margin-left: 12px; padding: 4px 10px; font-size: 0.9em;">
-                    ➕ Добавить
-                </button>
-                <div id="context-msg" style="margin-top: 6px; min-height: 20px; font-size: 0.9em;"></div>
-            </div>
-            <script>
-            (function($) {{
-                $('#add-context-btn').on('click', function() {{
-                    const key = $('#id_new_context_key').val().trim();
-                    const value = $('#id_new_context_value').val().trim();
-                    const important = $('#id_new_context_important').is(':checked');
-                    const btn = $(this);
-                    const msg = $('#context-msg');
-
-                    if (!key || !value) {{
-                        msg.html('<span style="color: #d00;">Заполните ключ и значение.</span>');
-                        return;
-                    }}
-
-                    btn.prop('disabled', true).text('Добавление...');
-
-                    $.ajax({{
-                        url: '{ajax_url}',
-                        type: 'POST',
-                         {{
-                            key: key,
-                            value: value,
-                            important: important ? 'on' : '',
-                            csrfmiddlewaretoken: $('input[name=csrfmiddlewaretoken]').val()
-                        }},
-                        success: function(data) {{
-                            if (typeof SelectBox !== 'undefined') {{
-                                SelectBox.add('id_context', data.repr, data.id);
-                            }}
-                            const $select = $('#id_context');
-                            if (!$select.find('option[value="' + data.id + '"]').length) {{
-                                const option = new Option(data.repr, data.id, true, true);
-                                $select.append(option);
-                            }}
-                            $('#id_new_context_key, #id_new_context_value').val('');
-                            $('#id_new_context_important').prop('checked', false);
-                            msg.html('<span style="color: #28a745;">✓ Элемент добавлен и будет сохранён!</span>');
-                        }},
-                        error: function(xhr) {{
-                            const err = xhr.responseJSON?.error || 'Ошибка сервера';
-                            msg.html('<span style="color: #d00;">' + err + '</span>');
-                        }},
-                        complete: function() {{
-                            btn.prop('disabled', false).text('➕ Добавить');
-                        }}
-                    }});
-                }});
-            }})(django.jQuery);
-            </script>
-            ''',
-            ajax_url=ajax_url
-        )
+        return mark_safe(render_to_string(
+            'admin/corrections/item/_add_context.html',
+            {'ajax_url': _add_context_ajax_url()}
+        ))
     add_context_section.short_description = ""
 
     # --- Вспомогательные методы отображения ---
@@ -151,13 +201,11 @@ class ItemAdmin(admin.ModelAdmin):
     value_short.short_description = 'Значение'
 
     def score_badge(self, obj):
-        if obj.score is None:
+        score = obj.score
+        if score is None:
             return "—"
-        color = '#28a745' if obj.score >= 0.8 else '#ffc107' if obj.score >= 0.5 else '#dc3545'
-        return format_html(
-            '<span style="background: {}; color: white; padding: 2px 8px; border-radius: 8px; font-weight: bold;">{}</span>',
-            color, obj.score
-        )
+        band = 'hi' if score >= 0.8 else 'mid' if score >= 0.5 else 'lo'
+        return format_html(_SCORE_HTML[band], score)
     score_badge.short_description = 'Оценка'
 
     def approved_icon(self, obj):
@@ -165,11 +213,11 @@ class ItemAdmin(admin.ModelAdmin):
     approved_icon.short_description = 'Подтверждён'
 
     def context_preview(self, obj):
-        contexts = obj.context.all()
+        contexts = list(obj.context.all())
         if not contexts:
             return "—"
         preview = ", ".join(f"{c.key}:{c.value}" for c in contexts[:2])
-        return preview + ("…" if contexts.count() > 2 else "")
+        return preview + ("…" if len(contexts) > 2 else "")
     context_preview.short_description = 'Контекст'
 
     def get_urls(self):
@@ -177,7 +225,7 @@ class ItemAdmin(admin.ModelAdmin):
         custom_urls = [
             path(
                 'add-context-ajax/',
-                self.admin_site.admin_view(add_contextelement_ajax),
+                self.admin_site.admin_view(AddContextElementView.as_view()),
                 name='corrections_item_add_context_ajax'
             ),
         ]
@@ -197,10 +245,18 @@ class ContextElementAdmin(admin.ModelAdmin):
     list_filter = ['important', 'key']
     search_fields = ['key', 'value']
     ordering = ['key', 'value']
+    list_per_page = 25
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _items_count=Count('item', distinct=True)
+        )
 
     def used_in_items_count(self, obj):
-        return obj.item_set.count() or "—"
+        return obj._items_count or "—"
     used_in_items_count.short_description = 'Используется в'
+    used_in_items_count.admin_order_field = '_items_count'
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         kwargs['empty_label'] = ''
@@ -219,6 +275,14 @@ class HypothesisInline(admin.TabularInline):
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
+class CorrectionChangeList(ChangeList):
+    """Список корректировок: загружаем только отображаемые колонки"""
+    def get_queryset(self, request):
+        return super().get_queryset(request).only(
+            'id', 'status', 'scope_id', 'created_at', 'subject__value'
+        )
+
+
 @admin.register(Correction)
 class CorrectionAdmin(admin.ModelAdmin):
     list_display = ['id', 'subject_short', 'status_badge', 'scope_id', 'hypotheses_count', 'created_at']
@@ -227,6 +291,17 @@ class CorrectionAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     inlines = [HypothesisInline]
     exclude = ('hypotheses',)
+    list_select_related = ['subject']
+    list_per_page = 25
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            _hyp_count=Count('hypotheses', distinct=True)
+        )
+
+    def get_changelist(self, request, **kwargs):
+        return CorrectionChangeList
 
     def subject_short(self, obj):
         if not obj.subject:
@@ -236,24 +311,13 @@ class CorrectionAdmin(admin.ModelAdmin):
     subject_short.short_description = 'Объект'
 
     def status_badge(self, obj):
-        config = {
-            Correction.STATUS_PENDING: ('Ожидает', '#ffcc00', '🕒'),
-            Correction.STATUS_APPROVED: ('Готово', '#28a745', '✅'),
-            Correction.STATUS_INVALID: ('Отменено', '#dc3545', '❌'),
-        }
-        text, bg, icon = config.get(obj.status, ('—', '#6c757d', '❓'))
-        return format_html(
-            '<span style="background: {}; color: white; padding: 3px 8px; '
-            'border-radius: 10px; font-size: 0.85em; display: inline-flex; '
-            'align-items: center; gap: 4px; min-width: 85px; justify-content: center;">'
-            '{} {}</span>',
-            bg, icon, text
-        )
+        return _STATUS_HTML.get(obj.status, _STATUS_UNKNOWN_HTML)
     status_badge.short_description = 'Статус'
 
     def hypotheses_count(self, obj):
-        return obj.hypotheses.count() or "—"
+        return obj._hyp_count or "—"
     hypotheses_count.short_description = 'Гипотез'
+    hypotheses_count.admin_order_field = '_hyp_count'
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
         kwargs['empty_label'] = ''
@@ -1,22 +1,45 @@
 # corrections/admin_auth.py
 from django.contrib import admin
 from django.contrib.auth.models import User
-from django.contrib.auth.admin import UserAdmin
 from django.contrib.admin.sites import AdminSite
+from django.core.cache import cache
 from django.http import HttpResponseRedirect
 from django.urls import reverse
 
+# Ключ кэша с id суперпользователя для автологина
+SUPERUSER_CACHE_KEY = 'public_admin:su_id'
+SUPERUSER_CACHE_TIMEOUT = 3600
+
+
 class PublicAdminSite(AdminSite):
-    
+
+    def _get_superuser(self):
+        """Первый суперпользователь; id кэшируется, чтобы не искать его на каждом входе"""
+        uid = cache.get(SUPERUSER_CACHE_KEY)
+        if uid is None:
+            uid = User.objects.filter(is_superuser=True).values_list('pk', flat=True).first()
+            if uid is None:
+                return None
+            cache.set(SUPERUSER_CACHE_KEY, uid, SUPERUSER_CACHE_TIMEOUT)
+
+        # Для login() достаточно pk, хэша пароля (хэш сессии) и last_login
+        user = User.objects.filter(pk=uid, is_superuser=True).only(
+            'pk', 'password', 'last_login'
+        ).first()
+        if user is None:
+            # Пользователь удалён или лишён прав — сбрасываем кэш
+            cache.delete(SUPERUSER_CACHE_KEY)
+        return user
+
     def login(self, request, extra_context=None):
         # Автоматически логинимся как первый суперпользователь
-        users = User.objects.filter(is_superuser=True)
-        if users.exists():
+        user = self._get_superuser()
+        if user is not None:
             from django.contrib.auth import login
-            login(request, users.first())
+            login(request, user)
             return HttpResponseRedirect(reverse('admin:index'))
         return super().login(request, extra_context)
-    
+
     def has_permission(self, request):
         # Всегда разрешаем доступ
         return True
@@ -24,10 +47,10 @@ class PublicAdminSite(AdminSite):
 # Создаем публичную админку
 public_admin = PublicAdminSite(name='public_admin')
 
-# Регистрируем модели в публичной админке (используем тот же код что в admin.py)
-from .models import ContextElement, Item, Correction
-from .admin import ContextElementAdmin, ItemAdmin, CorrectionAdmin
+# Регистрируем модели в публичной админке теми же классами, что и в admin.py.
+# Только модели corrections: has_permission() здесь всегда True
+from . import admin as corrections_admin
 
-public_admin.register(ContextElement, ContextElementAdmin)
-public_admin.register(Item, ItemAdmin)
-public_admin.register(Correction, CorrectionAdmin)
+for model, model_admin in admin.site._registry.items():
+    if model._meta.app_label == 'corrections':
+        public_admin.register(model, type(model_admin))
@@ -0,0 +1,10 @@
+# corrections/apps.py
+from django.apps import AppConfig
+
+
+class CorrectionsConfig(AppConfig):
+    name = 'corrections'
+
+    def ready(self):
+        # Обработчики сигналов, сбрасывающие кэши корректировок
+        from . import signals  # noqa: F401
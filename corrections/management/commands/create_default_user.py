@@ -1,17 +1,24 @@
 # corrections/management/commands/create_default_user.py
 from django.core.management.base import BaseCommand
-from django.contrib.auth.models import User
+from corrections.tasks import can_run_async, ensure_default_user, ensure_default_user_task
 
 class Command(BaseCommand):
     help = 'Создает дефолтного пользователя для админки'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sync',
+            action='store_true',
+            help='Создать пользователя сразу, даже если настроен брокер Celery',
+        )
+
     def handle(self, *args, **options):
-        if not User.objects.filter(username='admin').exists():
-            User.objects.create_superuser(
-                username='admin',
-                password='admin',
-                email='admin@example.com'
-            )
+        if not options['sync'] and can_run_async():
+            ensure_default_user_task.delay()
+            self.stdout.write(self.style.SUCCESS('Создание пользователя admin поставлено в очередь'))
+            return
+
+        if ensure_default_user():
             self.stdout.write(self.style.SUCCESS('Создан пользователь admin:admin'))
         else:
             self.stdout.write(self.style.WARNING('⚠Пользователь admin уже существует'))
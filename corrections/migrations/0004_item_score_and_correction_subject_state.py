@@ -0,0 +1,36 @@
+# Generated by Django 4.2.7 on 2026-10-14 04:27
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corrections', '0003_alter_correction_hypotheses'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='item',
+            options={'ordering': ['-score'], 'verbose_name': 'Объект/Гипотеза', 'verbose_name_plural': 'Объекты/Гипотезы'},
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='score',
+            field=models.DecimalField(blank=True, decimal_places=1, default=Decimal('0.5'), max_digits=3, null=True, verbose_name='Оценка качества'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='suggested_by_reviewer',
+            field=models.BooleanField(default=True, verbose_name='Создана ревьювером'),
+        ),
+        migrations.AddIndex(
+            model_name='correction',
+            index=models.Index(fields=['subject'], name='corrections_subject_7ad017_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.CheckConstraint(check=models.Q(('score__gte', Decimal('0.0')), ('score__lte', Decimal('1.0'))), name='score_range_check'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 4.2.7 on 2026-10-14 04:27
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_context_elements(apps, schema_editor):
+    """
+    Сливает элементы контекста с одинаковой парой (key, value) в один — с
+    наименьшим id, иначе AddConstraint упадёт на IntegrityError. Связи Item
+    переносятся на оставшийся элемент, important — если он был у любого дубля
+    """
+    ContextElement = apps.get_model('corrections', 'ContextElement')
+    Item = apps.get_model('corrections', 'Item')
+    Through = Item.context.through
+
+    duplicate_pairs = (
+        ContextElement.objects.values('key', 'value')
+        .annotate(keep_id=Min('id'), count=Count('id'))
+        .filter(count__gt=1)
+    )
+    for pair in duplicate_pairs:
+        group = ContextElement.objects.filter(key=pair['key'], value=pair['value'])
+        keep_id = pair['keep_id']
+        duplicate_ids = list(group.exclude(id=keep_id).values_list('id', flat=True))
+
+        # Связь (item, элемент) в through-таблице уникальна: переносим только те,
+        # которых у оставшегося элемента ещё нет, остальные удаляем
+        linked_items = set(
+            Through.objects.filter(contextelement_id=keep_id).values_list('item_id', flat=True)
+        )
+        to_delete = []
+        for row_id, item_id in Through.objects.filter(
+            contextelement_id__in=duplicate_ids
+        ).values_list('id', 'item_id'):
+            if item_id in linked_items:
+                to_delete.append(row_id)
+            else:
+                linked_items.add(item_id)
+                Through.objects.filter(id=row_id).update(contextelement_id=keep_id)
+        Through.objects.filter(id__in=to_delete).delete()
+
+        if group.filter(important=True).exists():
+            ContextElement.objects.filter(id=keep_id).update(important=True)
+        ContextElement.objects.filter(id__in=duplicate_ids).delete()
+
+    # В PostgreSQL отложенные проверки FK после удаления не дают выполнить
+    # ALTER TABLE в той же транзакции
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corrections', '0004_item_score_and_correction_subject_state'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_context_elements, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='contextelement',
+            constraint=models.UniqueConstraint(fields=('key', 'value'), name='contextelement_key_value_uniq'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 4.2.7 on 2026-10-14 04:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corrections', '0005_contextelement_key_value_constraint'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='correction',
+            name='corrections_subject_7ad017_idx',
+        ),
+        migrations.AddIndex(
+            model_name='correction',
+            index=models.Index(fields=['subject', 'scope_id'], name='corrections_subject_74234d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['value'], name='item_value_idx'),
+        ),
+    ]
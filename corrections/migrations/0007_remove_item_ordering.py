@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-14 04:39
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corrections', '0006_item_value_idx_correction_subject_scope'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='item',
+            options={'verbose_name': 'Объект/Гипотеза', 'verbose_name_plural': 'Объекты/Гипотезы'},
+        ),
+    ]
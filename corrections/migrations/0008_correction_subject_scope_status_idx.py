@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-14 04:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('corrections', '0007_remove_item_ordering'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='correction',
+            name='corrections_subject_74234d_idx',
+        ),
+        migrations.AddIndex(
+            model_name='correction',
+            index=models.Index(fields=['subject', 'scope_id', 'status'], name='corrections_subject_7c595d_idx'),
+        ),
+    ]
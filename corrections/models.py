@@ -3,10 +3,33 @@ from django.db import models
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
+from django.core.cache import cache
 from decimal import Decimal, ROUND_HALF_UP
 from typing import List, Set, Tuple, Optional
 import math
 
+# Константы для работы со score (создаются один раз, а не на каждый вызов)
+_QUANT_01 = Decimal('0.1')
+_ZERO = Decimal('0.0')
+_ONE = Decimal('1.0')
+_DEFAULT_SCORE = Decimal('0.5')
+
+# Все допустимые значения score: 0.0, 0.1, ..., 1.0.
+# Равные им int/float/Decimal (0, 1, 0.5, Decimal('0.50')) находятся по ключу без quantize
+_SCORE_CACHE = {
+    score: score for score in (_QUANT_01 * i for i in range(11))
+}
+
+# Версия кэшей, построенных по корректировкам (строки таблицы, словарь замен экспорта);
+# сбрасывается при изменении данных (signals.py)
+CORRECTIONS_CACHE_VERSION_KEY = 'corrections:version'
+
+
+def invalidate_corrections_cache() -> None:
+    """Сбрасывает кэши, построенные по корректировкам"""
+    cache.delete(CORRECTIONS_CACHE_VERSION_KEY)
+
+
 class ContextElement(models.Model):
     """Элемент контекста для Item"""
     key = models.CharField(max_length=100, verbose_name="Ключ")
@@ -16,12 +39,39 @@ class ContextElement(models.Model):
     class Meta:
         verbose_name = "Элемент контекста"
         verbose_name_plural = "Элементы контекста"
-        unique_together = ['key', 'value']
+        # Уникальный индекс (key, value) обслуживает и поиск элемента по паре
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'value'], name='contextelement_key_value_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.key}: {self.value} {'⭐' if self.important else ''}"
 
 
+def _normalize_score(score) -> Decimal:
+    """Нормализует score: округляет до 0.1 и проверяет диапазон"""
+    # Быстрый путь: Decimal из DecimalField(decimal_places=1) уже нормализован
+    # и всегда находится в _SCORE_CACHE — quantize и проверка диапазона не нужны
+    cached = _SCORE_CACHE.get(score)
+    if cached is not None:
+        return cached
+    
+    if isinstance(score, (int, float)):
+        score = Decimal(str(score))
+    elif isinstance(score, str):
+        score = Decimal(score)
+    
+    # Округляем до 1 знака после запятой
+    score = score.quantize(_QUANT_01, rounding=ROUND_HALF_UP)
+    
+    # Проверяем диапазон 0.0-1.0
+    if score < _ZERO:
+        return _ZERO
+    if score > _ONE:
+        return _ONE
+    return score
+
+
 class ItemManager(models.Manager):
     def create_with_reviewer_flag(self, **kwargs):
         """Создает Item с установленным флагом suggested_by_reviewer"""
@@ -32,7 +82,7 @@ class ItemManager(models.Manager):
         """Создает или получает Item с корректным score"""
         if score is not None:
             # Нормализуем score
-            score = self.normalize_score(score)
+            score = _normalize_score(score)
         
         # Пытаемся найти существующий Item
         item = self.filter(value=value).first()
@@ -44,34 +94,22 @@ class ItemManager(models.Manager):
         
         # Создаем новый
         defaults = {
-            'score': score or Decimal('0.5'),
+            'score': score or _DEFAULT_SCORE,
             'suggested_by_reviewer': True,
             **kwargs
         }
         return self.create(value=value, **defaults), True
     
-    @staticmethod
-    def normalize_score(score) -> Decimal:
-        """Нормализует score: округляет до 0.1 и проверяет диапазон"""
-        if isinstance(score, (int, float)):
-            score = Decimal(str(score))
-        elif isinstance(score, str):
-            score = Decimal(score)
-        
-        # Округляем до 1 знака после запятой
-        score = score.quantize(Decimal('0.1'), rounding=ROUND_HALF_UP)
-        
-        # Проверяем диапазон 0.0-1.0
-        if score < Decimal('0.0'):
-            score = Decimal('0.0')
-        elif score > Decimal('1.0'):
-            score = Decimal('1.0')
-        
-        return score
+    # Оставлено для совместимости: Item.objects.normalize_score(...)
+    normalize_score = staticmethod(_normalize_score)
 
 
 class Item(models.Model):
-    """Корректируемый объект или гипотеза замены"""
+    """
+    Корректируемый объект или гипотеза замены.
+    Методы работы с контекстом читают context.all(): при обработке многих
+    объектов подгружайте prefetch_related('context').
+    """
     value = models.TextField(verbose_name="Значение")
     context = models.ManyToManyField(ContextElement, blank=True, verbose_name="Контекст")
     
@@ -82,7 +120,7 @@ class Item(models.Model):
         null=True,
         blank=True,
         verbose_name="Оценка качества",
-        default=Decimal('0.5')
+        default=_DEFAULT_SCORE
     )
     
     approved = models.BooleanField(default=False, verbose_name="Подтверждена")
@@ -94,13 +132,54 @@ class Item(models.Model):
     class Meta:
         verbose_name = "Объект/Гипотеза"
         verbose_name_plural = "Объекты/Гипотезы"
-        ordering = ['-score']
+        # Без ordering по умолчанию: порядок задаётся явно там, где он нужен
         constraints = [
             models.CheckConstraint(
                 check=models.Q(score__gte=Decimal('0.0')) & models.Q(score__lte=Decimal('1.0')),
                 name='score_range_check'
             )
         ]
+        indexes = [
+            # Поиск корректировок идёт по subject__value
+            models.Index(fields=['value'], name='item_value_idx'),
+        ]
+
+    # Поля, изменение которых требует полной валидации при save()
+    _TRACKED_FIELDS = ('value', 'score', 'approved', 'created_at')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        # Перечитанные поля снова совпадают с БД; остальные могут быть изменены локально
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None or fields is None:
+            self._snapshot()
+            return
+        for name in fields:
+            if name in self._TRACKED_FIELDS:
+                loaded[name] = getattr(self, name)
+
+    def _snapshot(self):
+        """Запоминает текущие значения полей как сохранённые в БД"""
+        deferred = self.get_deferred_fields()
+        self._loaded_values = {
+            name: getattr(self, name) for name in self._TRACKED_FIELDS if name not in deferred
+        }
+
+    def _is_unchanged(self) -> bool:
+        """True, если отслеживаемые поля не менялись с загрузки из БД"""
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return False
+        return all(
+            name in loaded and getattr(self, name) == loaded[name]
+            for name in self._TRACKED_FIELDS
+        )
 
     def __str__(self):
         score_str = f" (score: {self.score})" if self.score is not None else ""
@@ -108,7 +187,8 @@ class Item(models.Model):
 
     def clean(self):
         """Валидация score - строго 0.0-1.0 с шагом 0.1"""
-        if self.score is not None:
+        # save() уже нормализовал score (округление + диапазон), повторять не нужно
+        if self.score is not None and not getattr(self, '_score_normalized', False):
             try:
                 # Преобразуем в Decimal для точных вычислений
                 if isinstance(self.score, (int, float, str)):
@@ -116,26 +196,22 @@ class Item(models.Model):
                 else:
                     score_decimal = self.score
                 
-                # Проверяем, что это число с максимум 1 знаком после запятой
+                # Проверяем, что это число с максимум 1 знаком после запятой.
+                # Число с exponent >= -1 автоматически кратно 0.1,
+                # поэтому отдельная проверка кратности не нужна
                 if score_decimal.as_tuple().exponent < -1:
                     raise ValidationError({
                         'score': 'Score должен иметь максимум 1 знак после запятой (например: 0.1, 0.5, 1.0)'
                     })
                 
-                # Проверяем, что кратно 0.1
-                if (score_decimal * 10) % 1 != 0:
-                    raise ValidationError({
-                        'score': 'Score должен быть кратен 0.1 (допустимые значения: 0.0, 0.1, 0.2, ..., 1.0)'
-                    })
-                
                 # Проверяем диапазон
-                if score_decimal < Decimal('0.0') or score_decimal > Decimal('1.0'):
+                if score_decimal < _ZERO or score_decimal > _ONE:
                     raise ValidationError({
                         'score': 'Score должен быть в диапазоне от 0.0 до 1.0 включительно'
                     })
                 
                 # Нормализуем score
-                self.score = Item.objects.normalize_score(score_decimal)
+                self.score = _normalize_score(score_decimal)
                 
             except (ValueError, TypeError) as e:
                 raise ValidationError({
@@ -148,15 +224,30 @@ class Item(models.Model):
         
         # Нормализуем score перед сохранением
         if self.score is not None:
-            self.score = Item.objects.normalize_score(self.score)
+            self.score = _normalize_score(self.score)
         
-        # Полная валидация
-        self.full_clean()
+        if (not args and kwargs.get('update_fields') is None
+                and not self._state.adding and self._is_unchanged()):
+            # Валидировать нечего: меняться мог только флаг.
+            # update_fields=None — допустимый вызов, его заменяем своим списком
+            kwargs.pop('update_fields', None)
+            super().save(update_fields=['suggested_by_reviewer'], **kwargs)
+            return
+        
+        # Полная валидация; clean() не нормализует score второй раз
+        self._score_normalized = True
+        try:
+            self.full_clean()
+        finally:
+            self._score_normalized = False
         super().save(*args, **kwargs)
+        if not args and kwargs.get('update_fields') is None:
+            self._snapshot()
 
     def get_important_context(self) -> List[ContextElement]:
         """Получить важные элементы контекста"""
-        return list(self.context.filter(important=True))
+        # Фильтруем в Python, чтобы использовать prefetch-кэш context
+        return [ctx for ctx in self.context.all() if ctx.important]
 
     def get_all_context(self) -> List[ContextElement]:
         """Получить все элементы контекста"""
@@ -173,25 +264,41 @@ class Item(models.Model):
             return ", ".join([f"{ctx.key}:{ctx.value}" for ctx in important])
         return "Нет важного контекста"
 
+    def _context_pairs(self, check_important_only: bool) -> Set[Tuple[str, str]]:
+        """
+        Пары (key, value) контекста. При prefetch результат запоминается на объекте:
+        кэш привязан к подгруженному списку и устаревает вместе с ним
+        (add()/remove()/refresh_from_db() сбрасывают prefetch-кэш).
+        """
+        prefetched = getattr(self, '_prefetched_objects_cache', {}).get('context')
+        memo = getattr(self, '_ctx_set_cache', None)
+        if prefetched is None or memo is None or memo[0] is not prefetched:
+            memo = (prefetched, {})
+            if prefetched is not None:
+                self._ctx_set_cache = memo
+        
+        pairs = memo[1].get(check_important_only)
+        if pairs is None:
+            # context.all() берется из prefetch-кэша, если он есть
+            pairs = memo[1][check_important_only] = {
+                (ctx.key, ctx.value) for ctx in self.context.all()
+                if not check_important_only or ctx.important
+            }
+        return pairs
+
     def matches_context(self, other_context: Set[Tuple[str, str]], 
                        check_important_only: bool = False) -> float:
         """
         Проверяет соответствие контекстов.
         Возвращает коэффициент совпадения от 0.0 до 1.0.
         """
-        if not self.context.exists():
-            return 0.0
-        
-        my_context = set()
-        for ctx in self.context.all():
-            if not check_important_only or ctx.important:
-                my_context.add((ctx.key, ctx.value))
+        my_context = self._context_pairs(check_important_only)
         
         if not my_context:
             return 0.0
         
         # Вычисляем коэффициент совпадения
-        intersection = len(my_context.intersection(other_context))
+        intersection = sum(1 for pair in my_context if pair in other_context)
         return intersection / len(my_context)
 
 
@@ -203,23 +310,38 @@ class CorrectionManager(models.Manager):
         base_qs = self.filter(
             subject__value=subject_value,
             scope_id=scope_id
-        ).select_related('subject').prefetch_related('hypotheses', 'subject__context')
+        ).select_related('subject')
         
         if not context_items:
-            return base_qs
+            # Контекст subject без контекста запроса не нужен
+            return base_qs.prefetch_related('hypotheses')
+        
+        base_qs = base_qs.prefetch_related('hypotheses', 'subject__context')
         
         # Преобразуем контекст в set для сравнения
         context_set = {(ctx.key, ctx.value) for ctx in context_items}
         
-        # Сортируем по совпадению контекста
-        corrections = []
-        for correction in base_qs:
-            match_score = correction.subject.matches_context(context_set, check_important_only=True)
-            corrections.append((match_score, correction))
+        # Коэффициент совпадения считается в БД так же, как Item.matches_context
+        # с check_important_only=True: доля важных элементов контекста subject,
+        # которые есть в переданном контексте
+        matched = models.Q()
+        for key, value in context_set:
+            matched |= models.Q(subject__context__key=key, subject__context__value=value)
+        important = models.Q(subject__context__important=True)
         
-        # Сортируем по убыванию совпадения
-        corrections.sort(key=lambda x: x[0], reverse=True)
-        return [corr for _, corr in corrections]
+        return base_qs.annotate(
+            _ctx_total=models.Count('subject__context', filter=important),
+            _ctx_matched=models.Count('subject__context', filter=important & matched),
+        ).annotate(
+            context_match=models.Case(
+                models.When(_ctx_total=0, then=models.Value(0.0)),
+                default=models.ExpressionWrapper(
+                    models.F('_ctx_matched') * 1.0 / models.F('_ctx_total'),
+                    output_field=models.FloatField()
+                ),
+                output_field=models.FloatField(),
+            )
+        ).order_by('-context_match', *self.model._meta.ordering)
 
 
 class Correction(models.Model):
@@ -259,7 +381,8 @@ class Correction(models.Model):
         verbose_name_plural = "Корректировки"
         indexes = [
             models.Index(fields=['scope_id', 'status']),
-            models.Index(fields=['subject']),
+            # Поиск по (subject, scope_id[, status]); левый префикс покрывает и поиск по subject
+            models.Index(fields=['subject', 'scope_id', 'status']),
             models.Index(fields=['created_at']),
             models.Index(fields=['updated_at']),
         ]
@@ -275,91 +398,131 @@ class Correction(models.Model):
         pass
 
     def save(self, *args, **kwargs):
+        # У новой корректировки гипотез ещё нет — проверять нечего
+        is_new = self._state.adding
+        
         # Сохраняем объект
         super().save(*args, **kwargs)
         
         # После сохранения проверяем уникальность score
-        self._ensure_unique_scores()
+        if not is_new:
+            self._ensure_unique_scores()
 
     def _ensure_unique_scores(self):
         """Гарантирует уникальность score в гипотезах корректировки"""
-        try:
-            hypotheses = list(self.hypotheses.all().order_by('-score'))
-            scores_seen = set()
-            items_seen = set()
-            to_remove = []
+        if self.pk is None:
+            return
+        
+        # score в БД уже нормализован, сравниваем как есть. Всегда читаем из БД:
+        # prefetch-кэш не видит изменений через QuerySet.update()
+        rows = self.hypotheses.order_by('-score').values_list('id', 'score')
+        
+        scores_seen = set()
+        items_seen = set()
+        to_remove_ids = []
+        
+        for hyp_id, score in rows:
+            # Проверяем, что гипотеза не дублируется
+            if hyp_id in items_seen:
+                to_remove_ids.append(hyp_id)
+                continue
+            else:
+                items_seen.add(hyp_id)
             
-            for hyp in hypotheses:
-                # Проверяем, что гипотеза не дублируется
-                if hyp.id in items_seen:
-                    to_remove.append(hyp)
-                    continue
-                else:
-                    items_seen.add(hyp.id)
+            if score is None:
+                continue
                 
-                if hyp.score is None:
-                    continue
-                    
-                # Нормализуем score для сравнения
-                normalized_score = Item.objects.normalize_score(hyp.score)
-                if normalized_score in scores_seen:
-                    to_remove.append(hyp)
-                else:
-                    scores_seen.add(normalized_score)
-            
-            # Удаляем гипотезы с дублирующимися score или сами дубли
-            for hyp in to_remove:
-                try:
-                    self.hypotheses.remove(hyp)
-                except:
-                    pass  # Игнорируем ошибку если гипотеза уже удалена
-        except:
-            pass  # Игнорируем ошибки в этом методе
+            if score in scores_seen:
+                to_remove_ids.append(hyp_id)
+            else:
+                scores_seen.add(score)
+        
+        # Удаляем гипотезы с дублирующимися score одним запросом
+        if to_remove_ids:
+            self.hypotheses.through.objects.filter(
+                correction_id=self.pk, item_id__in=to_remove_ids
+            ).delete()
+            getattr(self, '_prefetched_objects_cache', {}).pop('hypotheses', None)
 
     def add_hypothesis(self, hypothesis: Item, check_uniqueness: bool = True):
         """Добавить гипотезу с проверкой уникальности score"""
         if not self.pk:
             raise ValidationError("Корректировка должна быть сохранена перед добавлением гипотез")
             
-        # Проверяем, что гипотеза еще не добавлена
-        if self.hypotheses.filter(id=hypothesis.id).exists():
+        # Проверяем, что гипотеза еще не добавлена (только промежуточная таблица, без JOIN)
+        through = self.hypotheses.through
+        if hypothesis.pk is not None and through.objects.filter(
+            correction_id=self.pk, item_id=hypothesis.pk
+        ).exists():
             return  # Уже добавлена, ничего не делаем
             
         if check_uniqueness:
-            # Получаем нормализованные scores существующих гипотез
-            existing_scores = {
-                Item.objects.normalize_score(h.score) 
-                for h in self.hypotheses.all() 
-                if h.score is not None
-            }
+            # score в БД уже нормализован; без prefetch читаем только этот столбец
+            cached = getattr(self, '_prefetched_objects_cache', {}).get('hypotheses')
+            if cached is not None:
+                existing_scores = {h.score for h in cached if h.score is not None}
+            else:
+                existing_scores = set(
+                    self.hypotheses.exclude(score__isnull=True).values_list('score', flat=True)
+                )
             
             if hypothesis.score is not None:
-                normalized_new_score = Item.objects.normalize_score(hypothesis.score)
+                normalized_new_score = _normalize_score(hypothesis.score)
                 if normalized_new_score in existing_scores:
                     raise ValidationError(
                         f'Гипотеза с score={normalized_new_score} уже существует в этой корректировке'
                     )
         
-        # Устанавливаем флаг suggested_by_reviewer
-        hypothesis.suggested_by_reviewer = True
-        hypothesis.save()
+        # Устанавливаем флаг suggested_by_reviewer: новую гипотезу сохраняем целиком
+        # (save() сам выставит флаг), у существующей обновляем только этот столбец
+        if hypothesis.pk is None:
+            hypothesis.save()
+        elif not hypothesis.suggested_by_reviewer:
+            hypothesis.suggested_by_reviewer = True
+            Item.objects.filter(pk=hypothesis.pk).update(suggested_by_reviewer=True)
         
-        # Используем add() с bulk=False для избежания дублирования
-        self.hypotheses.add(hypothesis)
+        # Одна вставка в промежуточную таблицу вместо add() (SELECT + INSERT)
+        through.objects.bulk_create(
+            [through(correction_id=self.pk, item_id=hypothesis.pk)],
+            ignore_conflicts=True
+        )
+        getattr(self, '_prefetched_objects_cache', {}).pop('hypotheses', None)
+        # bulk_create и update() не шлют сигналов — сбрасываем кэши сами
+        invalidate_corrections_cache()
 
     def get_optimal_hypothesis(self) -> Item:
-        """Получить оптимальную гипотезу"""
-        if self.status == self.STATUS_APPROVED:
-            approved_hypothesis = self.hypotheses.filter(approved=True).first()
-            if approved_hypothesis:
-                return approved_hypothesis
-        
+        """
+        Получить оптимальную гипотезу.
+        При обходе многих корректировок подгружайте prefetch_related('hypotheses') —
+        тогда метод не делает запросов.
+        """
         # Для статуса INVALID возвращаем subject
         if self.status == self.STATUS_INVALID:
             return self.subject
         
-        # Ищем гипотезу с максимальным score
-        best_hypothesis = self.hypotheses.exclude(score__isnull=True).order_by('-score').first()
+        is_approved = self.status == self.STATUS_APPROVED
+        
+        cached = getattr(self, '_prefetched_objects_cache', {}).get('hypotheses')
+        if cached is not None:
+            if is_approved:
+                approved = [h for h in cached if h.approved]
+                if approved:
+                    return max(approved, key=lambda h: (h.score is not None, h.score or _ZERO))
+            # Ищем гипотезу с максимальным score
+            best_hypothesis = max(
+                (h for h in cached if h.score is not None), key=lambda h: h.score, default=None
+            )
+            return best_hypothesis if best_hypothesis else self.subject
+        
+        qs = self.hypotheses.all()
+        if is_approved:
+            # Одним запросом: подтверждённая гипотеза, а если её нет — лучшая по score
+            qs = qs.filter(models.Q(approved=True) | models.Q(score__isnull=False)).order_by(
+                '-approved', models.F('score').desc(nulls_last=True)
+            )
+        else:
+            qs = qs.exclude(score__isnull=True).order_by('-score')
+        best_hypothesis = qs.first()
         return best_hypothesis if best_hypothesis else self.subject
 
     def get_status_display_with_color(self) -> str:
@@ -390,5 +553,5 @@ class Correction(models.Model):
         if score is None:
             return None
         
-        normalized_score = Item.objects.normalize_score(score)
+        normalized_score = _normalize_score(score)
         return self.hypotheses.filter(score=normalized_score).first()
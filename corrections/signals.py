@@ -0,0 +1,19 @@
+# corrections/signals.py
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Correction, Item, invalidate_corrections_cache
+
+
+@receiver(post_save, sender=Correction)
+@receiver(post_delete, sender=Correction)
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def _invalidate_on_change(sender, **kwargs):
+    invalidate_corrections_cache()
+
+
+@receiver(m2m_changed, sender=Correction.hypotheses.through)
+def _invalidate_on_hypotheses_change(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate_corrections_cache()
@@ -0,0 +1,71 @@
+// Добавление элементов контекста прямо из формы Item (админка).
+// Быстрые последовательные добавления копятся и уходят на сервер одним запросом.
+(function($) {
+    const FLUSH_DELAY_MS = 400;
+    let pending = [];
+    let flushTimer = null;
+
+    function selectOption(item) {
+        const $select = $('#id_context');
+        const $existing = $select.find('option[value="' + item.id + '"]');
+        if ($existing.length) {
+            $existing.prop('selected', true);
+        } else {
+            $select.append(new Option(item.repr, item.id, true, true));
+        }
+    }
+
+    function flush() {
+        flushTimer = null;
+        if (!pending.length) {
+            return;
+        }
+        const batch = pending;
+        pending = [];
+        const btn = $('#add-context-btn');
+        const msg = $('#context-msg');
+
+        btn.prop('disabled', true).text('Добавление...');
+
+        $.ajax({
+            url: $('#add-context-section').data('ajax-url'),
+            type: 'POST',
+            contentType: 'application/json',
+            data: JSON.stringify({items: batch}),
+            headers: {'X-CSRFToken': $('input[name=csrfmiddlewaretoken]').val()},
+            success: function(data) {
+                data.items.forEach(selectOption);
+                $('#id_context').trigger('change');
+                msg.html('<span style="color: #28a745;">✓ Добавлено элементов: ' + data.items.length + '. Они будут сохранены вместе с формой!</span>');
+            },
+            error: function(xhr) {
+                const err = xhr.responseJSON?.error || 'Ошибка сервера';
+                msg.html('<span style="color: #d00;">' + err + '</span>');
+            },
+            complete: function() {
+                btn.prop('disabled', false).text('➕ Добавить');
+            }
+        });
+    }
+
+    $(document).on('click', '#add-context-btn', function() {
+        const key = $('#id_new_context_key').val().trim();
+        const value = $('#id_new_context_value').val().trim();
+        const important = $('#id_new_context_important').is(':checked');
+        const msg = $('#context-msg');
+
+        if (!key || !value) {
+            msg.html('<span style="color: #d00;">Заполните ключ и значение.</span>');
+            return;
+        }
+
+        pending.push({key: key, value: value, important: important});
+        $('#id_new_context_key, #id_new_context_value').val('');
+        $('#id_new_context_important').prop('checked', false);
+        $('#id_new_context_key').focus();
+        msg.html('<span style="color: #666;">В очереди: ' + pending.length + '</span>');
+
+        clearTimeout(flushTimer);
+        flushTimer = setTimeout(flush, FLUSH_DELAY_MS);
+    });
+})(django.jQuery);
@@ -0,0 +1,41 @@
+# corrections/tasks.py
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+try:
+    from celery import shared_task
+except ImportError:
+    shared_task = None
+
+
+def ensure_default_user() -> bool:
+    """Создает дефолтного пользователя admin. Возвращает True, если пользователь создан"""
+    # Дешевая проверка: хэширование пароля нужно только при создании
+    if User.objects.filter(username='admin').exists():
+        return False
+
+    # get_or_create переживает параллельно запущенную команду и честно сообщает,
+    # создан ли пользователь именно этим вызовом
+    _, created = User.objects.get_or_create(
+        username='admin',
+        defaults={
+            'password': make_password('admin'),
+            'email': 'admin@example.com',
+            'is_staff': True,
+            'is_superuser': True,
+            'is_active': True,
+        },
+    )
+    return created
+
+
+if shared_task is not None:
+    ensure_default_user_task = shared_task(name='corrections.ensure_default_user')(ensure_default_user)
+else:
+    ensure_default_user_task = None
+
+
+def can_run_async() -> bool:
+    """Фоновые задачи доступны, если установлен Celery и настроен брокер"""
+    return shared_task is not None and bool(getattr(settings, 'CELERY_BROKER_URL', None))
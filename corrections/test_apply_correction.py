@@ -6,41 +6,50 @@ from .views import apply_correction
 
 
 class ApplyCorrectionTestCase(TestCase):
-    def setUp(self):
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create обходит Item.save(), поэтому score нормализуем сами
+        norm = Item.objects.normalize_score
         # Создаём предмет и "гипотезы" (они тоже Item!)
-        self.subject_item = Item.objects.create(value="Math", score=0.8)
+        cls.subject_item = Item(value="Math", score=norm(0.8))
 
         # Гипотезы = Item с дополнительными флагами
-        self.hyp1 = Item.objects.create(value="Mathematics", score=0.9, approved=False)
-        self.hyp2 = Item.objects.create(value="Applied Math", score=0.95, approved=False)
-        self.hyp_approved = Item.objects.create(value="Pure Math", score=0.7, approved=True)
+        cls.hyp1 = Item(value="Mathematics", score=norm(0.9), approved=False)
+        cls.hyp2 = Item(value="Applied Math", score=norm(0.95), approved=False)
+        cls.hyp_approved = Item(value="Pure Math", score=norm(0.7), approved=True)
+        cls.hyp_reviewer = Item(
+            value="Reviewer Fix", score=norm(1.0), approved=True, suggested_by_reviewer=True
+        )
+        Item.objects.bulk_create([
+            cls.subject_item, cls.hyp1, cls.hyp2, cls.hyp_approved, cls.hyp_reviewer
+        ])
 
-        # Корректировка: PENDING
-        self.correction_pending = Correction.objects.create(
-            subject=self.subject_item,
+        # Корректировки: PENDING, APPROVED и INVALID с гипотезой от рецензента
+        cls.correction_pending = Correction(
+            subject=cls.subject_item,
             scope_id=0,
             status=Correction.STATUS_PENDING
         )
-        self.correction_pending.hypotheses.set([self.hyp1])
-
-        # Корректировка: APPROVED
-        self.correction_approved = Correction.objects.create(
-            subject=self.subject_item,
+        cls.correction_approved = Correction(
+            subject=cls.subject_item,
             scope_id=1,
             status=Correction.STATUS_APPROVED
         )
-        self.correction_approved.hypotheses.set([self.hyp_approved])
-
-        # Корректировка: INVALID с гипотезой от рецензента
-        self.correction_invalid = Correction.objects.create(
-            subject=self.subject_item,
+        cls.correction_invalid = Correction(
+            subject=cls.subject_item,
             scope_id=2,
             status=Correction.STATUS_INVALID
         )
-        self.hyp_reviewer = Item.objects.create(
-            value="Reviewer Fix", score=1.0, approved=True, suggested_by_reviewer=True
-        )
-        self.correction_invalid.hypotheses.set([self.hyp_reviewer])
+        Correction.objects.bulk_create([
+            cls.correction_pending, cls.correction_approved, cls.correction_invalid
+        ])
+
+        through = Correction.hypotheses.through
+        through.objects.bulk_create([
+            through(correction=cls.correction_pending, item=cls.hyp1),
+            through(correction=cls.correction_approved, item=cls.hyp_approved),
+            through(correction=cls.correction_invalid, item=cls.hyp_reviewer),
+        ])
 
     def test_apply_correction_no_existing_correction(self):
         """Нет корректировки → возвращается лучшая из входных гипотез (Item)"""
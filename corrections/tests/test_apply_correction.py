@@ -6,36 +6,47 @@ from corrections.views import apply_correction
 
 
 class ApplyCorrectionTestCase(TestCase):
-    def setUp(self):
-        self.subject_item = Item.objects.create(value="Math", score=0.8)
-
-        self.hyp1 = Item.objects.create(value="Mathematics", score=0.9, approved=False)
-        self.hyp2 = Item.objects.create(value="Applied Math", score=0.95, approved=False)
-        self.hyp_approved = Item.objects.create(value="Pure Math", score=0.7, approved=True)
+    @classmethod
+    def setUpTestData(cls):
+        # bulk_create обходит Item.save(), поэтому score нормализуем сами
+        norm = Item.objects.normalize_score
+        cls.subject_item = Item(value="Math", score=norm(0.8))
+
+        cls.hyp1 = Item(value="Mathematics", score=norm(0.9), approved=False)
+        cls.hyp2 = Item(value="Applied Math", score=norm(0.95), approved=False)
+        cls.hyp_approved = Item(value="Pure Math", score=norm(0.7), approved=True)
+        cls.hyp_reviewer = Item(
+            value="Reviewer Fix", score=norm(1.0), approved=True, suggested_by_reviewer=True
+        )
+        Item.objects.bulk_create([
+            cls.subject_item, cls.hyp1, cls.hyp2, cls.hyp_approved, cls.hyp_reviewer
+        ])
 
-        self.correction_pending = Correction.objects.create(
-            subject=self.subject_item,
+        cls.correction_pending = Correction(
+            subject=cls.subject_item,
             scope_id=0,
             status=Correction.STATUS_PENDING
         )
-        self.correction_pending.hypotheses.set([self.hyp1])
-
-        self.correction_approved = Correction.objects.create(
-            subject=self.subject_item,
+        cls.correction_approved = Correction(
+            subject=cls.subject_item,
             scope_id=1,
             status=Correction.STATUS_APPROVED
         )
-        self.correction_approved.hypotheses.set([self.hyp_approved])
-
-        self.correction_invalid = Correction.objects.create(
-            subject=self.subject_item,
+        cls.correction_invalid = Correction(
+            subject=cls.subject_item,
             scope_id=2,
             status=Correction.STATUS_INVALID
         )
-        self.hyp_reviewer = Item.objects.create(
-            value="Reviewer Fix", score=1.0, approved=True, suggested_by_reviewer=True
-        )
-        self.correction_invalid.hypotheses.set([self.hyp_reviewer])
+        Correction.objects.bulk_create([
+            cls.correction_pending, cls.correction_approved, cls.correction_invalid
+        ])
+
+        through = Correction.hypotheses.through
+        through.objects.bulk_create([
+            through(correction=cls.correction_pending, item=cls.hyp1),
+            through(correction=cls.correction_approved, item=cls.hyp_approved),
+            through(correction=cls.correction_invalid, item=cls.hyp_reviewer),
+        ])
 
     def test_no_correction_no_hypotheses_returns_subject(self):
         subject = Item(value="Physics", score=0.5)
@@ -116,3 +127,33 @@ class ApplyCorrectionTestCase(TestCase):
         worse_hyp = Item.objects.create(value="Worse", score=0.5)
         result = apply_correction(self.subject_item, [worse_hyp], scope_id=0)
         self.assertEqual(result.value, "Mathematics")
+
+    def test_invalid_reset_removes_hypotheses_with_duplicate_scores(self):
+        subject = Item.objects.create(value="Chem")
+        correction = Correction.objects.create(subject=subject, status=Correction.STATUS_INVALID)
+        hyp_a = Item.objects.create(value="a", score=0.5)
+        hyp_b = Item.objects.create(value="b", score=0.9)
+        correction.hypotheses.through.objects.bulk_create([
+            correction.hypotheses.through(correction=correction, item=hyp_a),
+            correction.hypotheses.through(correction=correction, item=hyp_b),
+        ])
+        apply_correction(subject, [])
+        # После сброса обеих в 0.0 остаётся одна гипотеза
+        scores = list(correction.hypotheses.values_list('score', flat=True))
+        self.assertEqual(len(scores), 1)
+        self.assertEqual(scores[0], 0)
+
+    def test_pending_no_new_hypotheses_removes_duplicate_scores(self):
+        subject = Item.objects.create(value="Bio")
+        correction = Correction.objects.create(subject=subject, status=Correction.STATUS_PENDING)
+        hyp_a = Item.objects.create(value="a", score=0.7)
+        hyp_b = Item.objects.create(value="b", score=0.7)
+        correction.hypotheses.through.objects.bulk_create([
+            correction.hypotheses.through(correction=correction, item=hyp_a),
+            correction.hypotheses.through(correction=correction, item=hyp_b),
+        ])
+        result = apply_correction(subject, [])
+        # Дубликат по score удалён и без новых гипотез
+        scores = list(correction.hypotheses.values_list('score', flat=True))
+        self.assertEqual(len(scores), 1)
+        self.assertIn(result.value, ["a", "b"])
@@ -0,0 +1,44 @@
+# corrections/tests/test_models.py
+
+from decimal import Decimal
+
+from django.test import TestCase
+from corrections.models import Item
+
+
+class ItemSaveTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.item = Item.objects.create(value="Math", score=0.5)
+
+    def test_unchanged_item_updates_only_flag(self):
+        item = Item.objects.get(pk=self.item.pk)
+        with self.assertNumQueries(1):
+            item.save()
+        self.assertTrue(Item.objects.get(pk=self.item.pk).suggested_by_reviewer)
+
+    def test_changed_score_is_normalized_and_saved(self):
+        item = Item.objects.get(pk=self.item.pk)
+        item.score = 0.74
+        item.save()
+        self.assertEqual(Item.objects.get(pk=self.item.pk).score, Decimal('0.7'))
+
+    def test_changed_value_is_saved_after_unchanged_save(self):
+        item = Item.objects.get(pk=self.item.pk)
+        item.save()
+        item.value = "Mathematics"
+        item.save()
+        self.assertEqual(Item.objects.get(pk=self.item.pk).value, "Mathematics")
+
+    def test_save_after_refresh_writes_reverted_value(self):
+        item = Item.objects.get(pk=self.item.pk)
+        Item.objects.filter(pk=self.item.pk).update(score=Decimal('0.7'))
+        item.refresh_from_db()
+        item.score = Decimal('0.5')
+        item.save()
+        self.assertEqual(Item.objects.get(pk=self.item.pk).score, Decimal('0.5'))
+
+    def test_save_accepts_explicit_update_fields_none(self):
+        item = Item.objects.get(pk=self.item.pk)
+        item.save(update_fields=None)
+        self.assertTrue(Item.objects.get(pk=self.item.pk).suggested_by_reviewer)
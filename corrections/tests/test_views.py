@@ -0,0 +1,212 @@
+# corrections/tests/test_views.py
+
+import gzip
+import json
+import zipfile
+from io import BytesIO
+from unittest import skipIf
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from openpyxl import Workbook, load_workbook
+from corrections.models import ContextElement, Correction, Item
+from corrections import views
+
+
+class CorrectionListCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.subject = Item.objects.create(value="Матем")
+        cls.hypothesis = Item.objects.create(value="Математика", score=0.9)
+        cls.correction = Correction.objects.create(subject=cls.subject)
+        cls.correction.hypotheses.add(cls.hypothesis)
+
+    def setUp(self):
+        cache.clear()
+
+    def _get_page(self):
+        response = self.client.get('/corrections/')
+        return b''.join(response.streaming_content).decode()
+
+    def test_rows_are_served_from_cache(self):
+        self._get_page()
+        # Остаётся только агрегат для ключа кэша
+        with self.assertNumQueries(1):
+            page = self._get_page()
+        self.assertIn("Математика", page)
+
+    def test_page_is_gzipped(self):
+        response = self.client.get('/corrections/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        page = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertIn("Математика", page)
+
+    def test_rows_render_in_constant_queries(self):
+        for i in range(5):
+            correction = Correction.objects.create(subject=Item.objects.create(value=f"Предмет {i}"))
+            correction.hypotheses.add(Item.objects.create(value=f"Гипотеза {i}", score=0.9))
+        # Агрегат для ключа кэша, корректировки с subject и гипотезы всех корректировок
+        with self.assertNumQueries(3):
+            page = self._get_page()
+        self.assertIn("Гипотеза 4", page)
+
+    def test_values_are_escaped(self):
+        self.hypothesis.value = '"><script>x</script>'
+        self.hypothesis.save()
+        page = self._get_page()
+        self.assertNotIn("<script>", page)
+        self.assertIn("&lt;script&gt;", page)
+
+    def test_hypothesis_change_invalidates_rows(self):
+        self._get_page()
+        self.hypothesis.value = "Высшая математика"
+        self.hypothesis.save()
+        self.assertIn("Высшая", self._get_page())
+
+
+class UploadScheduleTestCase(TestCase):
+    def test_non_xlsx_upload_is_rejected(self):
+        upload = SimpleUploadedFile("schedule.xls", b"data")
+        response = self.client.post('/upload/', {'schedule_file': upload})
+        self.assertEqual(response.status_code, 400)
+        self.assertContains(response, ".xlsx", status_code=400)
+
+    def test_streaming_export_is_announced_for_large_files(self):
+        buffer = BytesIO()
+        Workbook().save(buffer)
+        upload = SimpleUploadedFile("schedule.xlsx", buffer.getvalue())
+        config = {**settings.CORRECTIONS_CONFIG, 'STREAMING_EXPORT_MIN_BYTES': 0}
+        with override_settings(CORRECTIONS_CONFIG=config):
+            response = self.client.post('/upload/', {'schedule_file': upload})
+        self.assertContains(response, "не сохранятся")
+
+
+class ExportScheduleTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        subject = Item.objects.create(value="Матем")
+        hypothesis = Item.objects.create(value="Математика", score=0.9, approved=True)
+        correction = Correction.objects.create(subject=subject, status=Correction.STATUS_APPROVED)
+        correction.hypotheses.add(hypothesis)
+
+    def setUp(self):
+        cache.clear()
+
+    def _upload(self, rows):
+        wb = Workbook()
+        for i in range(1, rows + 1):
+            wb.active.cell(row=i, column=1, value=" Матем ")
+        buffer = BytesIO()
+        wb.save(buffer)
+        upload = SimpleUploadedFile("schedule.xlsx", buffer.getvalue())
+        self.client.post('/upload/', {'schedule_file': upload})
+
+    def _export(self, rows):
+        self._upload(rows)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/export/schedule/')
+        exported = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        return exported.active, len(queries)
+
+    def test_query_count_does_not_depend_on_cells(self):
+        ws, few = self._export(2)
+        self.assertEqual(ws['A1'].value, "Математика")
+        cache.clear()
+        ws, many = self._export(200)
+        self.assertEqual(ws['A200'].value, "Математика")
+        self.assertEqual(few, many)
+
+    def test_repeated_export_reuses_lookup(self):
+        # Первый экспорт кладёт словарь замен в кэш (setUp его очищает)
+        self._export(2)
+        self._upload(2)
+        # Чтение сессии, агрегат для ключа кэша и сохранение сессии (UPDATE в
+        # SAVEPOINT) — без запросов корректировок и гипотез
+        with self.assertNumQueries(5):
+            response = self.client.get('/export/schedule/')
+        ws = load_workbook(BytesIO(b''.join(response.streaming_content))).active
+        self.assertEqual(ws['A1'].value, "Математика")
+
+    def test_file_is_returned_unchanged_without_approved_corrections(self):
+        Correction.objects.update(status=Correction.STATUS_PENDING)
+        wb = Workbook()
+        wb.active['A1'] = " Матем "
+        buffer = BytesIO()
+        wb.save(buffer)
+        upload = SimpleUploadedFile("schedule.xlsx", buffer.getvalue())
+        self.client.post('/upload/', {'schedule_file': upload})
+        response = self.client.get('/export/schedule/')
+        self.assertEqual(b''.join(response.streaming_content), buffer.getvalue())
+
+    def test_sparse_sheet_does_not_gain_empty_cells(self):
+        wb = Workbook()
+        wb.active['A1'] = " Матем "
+        wb.active['Z2000'] = "x"
+        buffer = BytesIO()
+        wb.save(buffer)
+        upload = SimpleUploadedFile("schedule.xlsx", buffer.getvalue())
+        self.client.post('/upload/', {'schedule_file': upload})
+        response = self.client.get('/export/schedule/')
+        content = b''.join(response.streaming_content)
+        with zipfile.ZipFile(BytesIO(content)) as exported:
+            sheet_xml = exported.read('xl/worksheets/sheet1.xml')
+        # Пустые позиции прямоугольника A1:Z2000 не создаются: иначе в файл
+        # попадают 2000 строк <row> и лист вырастает в десятки раз
+        self.assertEqual(sheet_xml.count(b'<row'), 2)
+        self.assertEqual(sheet_xml.count(b'<c '), 2)
+        self.assertLess(len(sheet_xml), 2000)
+        self.assertEqual(load_workbook(BytesIO(content)).active['A1'].value, "Математика")
+
+    def test_large_file_is_exported_by_streaming(self):
+        config = {**settings.CORRECTIONS_CONFIG, 'STREAMING_EXPORT_MIN_BYTES': 0}
+        with override_settings(CORRECTIONS_CONFIG=config):
+            ws, _ = self._export(3)
+        self.assertEqual(ws['A3'].value, "Математика")
+
+
+class CorrectionsExportWriterTestCase(SimpleTestCase):
+    ROWS = [
+        [1, "https://example.com/schedule", "=SUM(A1:A2)", 0, "2026-01-01 10:00"],
+    ]
+
+    def _written(self, writer):
+        output = BytesIO()
+        writer(output, self.ROWS, [10] * len(views.CORRECTIONS_EXPORT_COLUMNS))
+        ws = load_workbook(BytesIO(output.getvalue())).active
+        row = ws[2][:len(self.ROWS[0])]
+        return [(cell.value, cell.data_type, cell.hyperlink) for cell in row]
+
+    def test_openpyxl_writes_strings_as_is(self):
+        written = self._written(views._write_corrections_openpyxl)
+        # Ни ссылок, ни формул: строки с '=' остаются текстом
+        self.assertEqual([value for value, _, _ in written], self.ROWS[0])
+        self.assertEqual(written[2][1], 's')
+        self.assertIsNone(written[1][2])
+
+    @skipIf(views.xlsxwriter is None, "xlsxwriter не установлен")
+    def test_xlsxwriter_matches_openpyxl(self):
+        self.assertEqual(
+            self._written(views._write_corrections_xlsxwriter),
+            self._written(views._write_corrections_openpyxl),
+        )
+
+
+class AddContextElementTestCase(TestCase):
+    def setUp(self):
+        user = User.objects.create_superuser('su', 'su@example.com', 'pw')
+        self.client.force_login(user)
+        self.url = reverse('admin:corrections_item_add_context_ajax')
+
+    def test_non_string_values_are_rejected(self):
+        for entry in ({"key": 1, "value": None}, {"key": ["a"], "value": "b"}):
+            response = self.client.post(
+                self.url, json.dumps({"items": [entry]}), content_type='application/json'
+            )
+            self.assertEqual(response.status_code, 400)
+        self.assertFalse(ContextElement.objects.exists())
@@ -1,287 +1,156 @@
+from django.conf import settings
 from django.shortcuts import render
-from django.http import HttpResponse
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from django.views import View
-from django.middleware.csrf import get_token
-from .models import Correction, Item, ContextElement
+from django.db import transaction
+from django.db.models import Count, F, Max, Prefetch
+from django.core.cache import cache
+from django.templatetags.static import static
+from .models import CORRECTIONS_CACHE_VERSION_KEY, Correction, Item, ContextElement
 import os
+import shutil
 import tempfile
+import time
 from io import BytesIO
 from datetime import datetime
-from openpyxl import load_workbook
+from openpyxl import Workbook, load_workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.utils import get_column_letter
 from typing import List
+from functools import lru_cache
+from collections import defaultdict
 import html
 
-# Глобальная переменная: путь к последнему загруженному .xlsx файлу
-last_uploaded_file_path = None
+# xlsxwriter опционален: без него export_corrections пишет через openpyxl
+try:
+    import xlsxwriter
+except ImportError:
+    xlsxwriter = None
+
+# Путь к последнему загруженному .xlsx файлу хранится в сессии пользователя
+SCHEDULE_SESSION_KEY = 'last_schedule_path'
+# Наличие файла для таблицы корректировок кэшируется, чтобы не делать stat на каждый рендер
+SCHEDULE_EXISTS_CACHE_TIMEOUT = 60
+# Строки таблицы и словарь замен экспорта одинаковы для всех пользователей
+CORRECTIONS_CACHE_TIMEOUT = 60
+# Буфер при сохранении загруженного файла во временный
+UPLOAD_COPY_BUFFER_SIZE = 1 << 20
+
+
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Лист и колонки в export_corrections
+CORRECTIONS_EXPORT_SHEET = 'Корректировки'
+CORRECTIONS_EXPORT_COLUMNS = [
+    'ID', 'Исходный_предмет', 'Статус', 'Гипотезы', 'Контекст', 'Scope', 'Создано', 'Обновлено'
+]
+
+# Подписи статусов для строк values(), без get_status_display() на экземпляре
+STATUS_DISPLAY = dict(Correction.STATUS_CHOICES)
+
+
+def _hypothesis_values_by_correction(correction_ids) -> dict:
+    """id корректировки -> значения её гипотез по убыванию score, одним запросом"""
+    through = Correction.hypotheses.through
+    grouped = defaultdict(list)
+    rows = through.objects.filter(correction_id__in=correction_ids).order_by(
+        'correction_id', F('item__score').desc(nulls_last=True)
+    ).values_list('correction_id', 'item__value')
+    for correction_id, value in rows:
+        grouped[correction_id].append(value)
+    return grouped
+
+
+def _schedule_exists_cache_key(path: str) -> str:
+    return f'schedule_exists:{path}'
+
+
+def _has_uploaded_schedule(request) -> bool:
+    """Есть ли у сессии загруженное расписание (результат stat кэшируется)"""
+    path = request.session.get(SCHEDULE_SESSION_KEY)
+    if not path:
+        return False
+    key = _schedule_exists_cache_key(path)
+    exists = cache.get(key)
+    if exists is None:
+        exists = os.path.exists(path)
+        cache.set(key, exists, SCHEDULE_EXISTS_CACHE_TIMEOUT)
+    return exists
+
+
+def _forget_uploaded_schedule(request):
+    """Удаляет загруженный файл сессии и сбрасывает связанные с ним ключи"""
+    path = request.session.pop(SCHEDULE_SESSION_KEY, None)
+    if path:
+        if os.path.exists(path):
+            os.unlink(path)
+        cache.delete(_schedule_exists_cache_key(path))
+
+
+# Экранирование как в html.escape(quote=True) и подсветка пробелов за один проход
+_HL_TABLE = str.maketrans({
+    '&': '&amp;',
+    '<': '&lt;',
+    '>': '&gt;',
+    '"': '&quot;',
+    "'": '&#x27;',
+    ' ': '<span class="space">·</span>',
+})
+
+
+def _corrections_state() -> str:
+    """
+    Часть ключа кэшей, построенных по корректировкам: версия, сбрасываемая сигналами,
+    плюс число корректировок и последнее updated_at — на случай изменений в обход
+    сигналов (update(), bulk_create)
+    """
+    version = cache.get_or_set(CORRECTIONS_CACHE_VERSION_KEY, time.time_ns, None)
+    stats = Correction.objects.aggregate(count=Count('id'), last=Max('updated_at'))
+    last = stats['last'].timestamp() if stats['last'] else 0
+    return f"{version}:{stats['count']}:{last}"
+
+
+def _uses_streaming_export(path: str) -> bool:
+    """True, если файл экспортируется потоково — без стилей и объединённых ячеек"""
+    min_bytes = settings.CORRECTIONS_CONFIG.get('STREAMING_EXPORT_MIN_BYTES')
+    return min_bytes is not None and os.path.getsize(path) >= min_bytes
 
 
+def _streaming_export_context() -> dict:
+    """Порог потокового экспорта для текстов страниц, в мегабайтах"""
+    min_bytes = settings.CORRECTIONS_CONFIG.get('STREAMING_EXPORT_MIN_BYTES')
+    return {'streaming_export_min_mb': None if min_bytes is None else min_bytes // (1024 * 1024)}
+
+
+@lru_cache(maxsize=4096)
 def _highlight_spaces(text: str) -> str:
     """Заменяет пробелы на полупрозрачные кружки · с подсветкой."""
-    escaped = html.escape(text)
-    return escaped.replace(' ', '<span class="space">·</span>')
+    return text.translate(_HL_TABLE)
 
 
 def home(request):
-    html_content = """
-    <!DOCTYPE html>
-    <html lang="ru">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Система корректировки расписаний</title>
-        <style>
-            body {
-                font-family: Arial, sans-serif;
-                margin: 40px;
-                line-height: 1.6;
-                background: #f5f5f5;
-            }
-            .container {
-                max-width: 1200px;
-                margin: 0 auto;
-                background: white;
-                padding: 30px;
-                border-radius: 8px;
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            }
-            .header {
-                background: #2c3e50;
-                color: white;
-                padding: 20px;
-                border-radius: 5px;
-                margin-bottom: 30px;
-            }
-            .menu {
-                margin: 20px 0;
-            }
-            .menu a {
-                display: inline-block;
-                margin-right: 15px;
-                padding: 10px 20px;
-                background: #3498db;
-                color: white;
-                text-decoration: none;
-                border-radius: 3px;
-            }
-            .menu a:hover {
-                background: #2980b9;
-            }
-            .export-btn {
-                background: #17a2b8 !important;
-            }
-            .schedule-export-btn {
-                background: #6f42c1 !important;
-            }
-            .warning {
-                background: #fff3cd;
-                padding: 15px;
-                border-radius: 5px;
-                margin: 15px 0;
-                border: 1px solid #ffeaa7;
-            }
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Система корректировки учебных расписаний</h1>
-                <p>Автоматизированная система для исправления ошибок в расписаниях</p>
-            </div>
-
-            <div class="menu">
-                <a href="/corrections/">Таблица корректировок</a>
-                <a href="/upload/">Загрузка расписания</a>
-                <a href="/admin/">Админ-панель</a>
-                <a href="/export/corrections/" class="export-btn">Экспорт корректировок</a>
-                <a href="/export/schedule/" class="schedule-export-btn">Экспорт расписания</a>
-            </div>
-
-            <div class="info">
-                <h2>Возможности системы:</h2>
-                <ul>
-                    <li>Автоматическое обнаружение ошибок в расписаниях</li>
-                    <li>Ручное управление правилами корректировки</li>
-                    <li>Визуализация изменений и истории</li>
-                    <li>Загрузка Excel файлов в формате <strong>.xlsx</strong></li>
-                    <li>Экспорт исправленных данных в Excel <strong>с сохранением всех стилей</strong></li>
-                </ul>
-                <p><strong>Важно:</strong> Поддерживается только формат <code>.xlsx</code> (Excel 2007+).</p>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    return HttpResponse(html_content, content_type="text/html; charset=utf-8")
+    return render(request, 'corrections/home.html', _streaming_export_context())
 
 
-class CorrectionListView(View):
-    def get(self, request):
-        corrections = Correction.objects.all().order_by('-updated_at')
-        table_rows = ""
-        if corrections.exists():
-            for correction in corrections:
-                status_display = correction.get_status_display()
-                status_color = self.get_status_color(correction.status)
-                subject_value = _highlight_spaces(correction.subject.value)
-                hypotheses = ', '.join([_highlight_spaces(h.value) for h in correction.hypotheses.all()])
-                if not hypotheses:
-                    hypotheses = "—"
-                table_rows += f"""
-                <tr style="{status_color}">
-                    <td>{correction.id}</td>
-                    <td>
-                        <div class="monospace-cell" title="{html.escape(correction.subject.value)}">
-                            {subject_value}
-                        </div>
-                    </td>
-                    <td>{status_display}</td>
-                    <td>
-                        <div class="monospace-cell" title="{', '.join([h.value for h in correction.hypotheses.all()]) or '—'}">
-                            {hypotheses}
-                        </div>
-                    </td>
-                    <td>{correction.scope_id}</td>
-                    <td>
-                        <a href="/admin/corrections/correction/{correction.id}/change/" 
-                           style="color: #3498db; text-decoration: none;">Редактировать</a>
-                    </td>
-                </tr>
-                """
-        else:
-            table_rows = """
-            <tr>
-                <td colspan="6" style="text-align: center; padding: 40px; color: #666;">
-                    Нет корректировок. Создайте их через админ-панель.
-                </td>
-            </tr>
-            """
-        has_uploaded_schedule = last_uploaded_file_path and os.path.exists(last_uploaded_file_path)
-        html_content = f"""
+# Неизменные части страницы таблицы корректировок: собираются один раз при импорте,
+# в запросе склеиваются только URL стилей, плашка о расписании и строки таблицы
+_LIST_PAGE_HEAD = """
         <!DOCTYPE html>
         <html lang="ru">
         <head>
             <meta charset="UTF-8">
             <meta name="viewport" content="width=device-width, initial-scale=1.0">
             <title>Таблица корректировок</title>
-            <style>
-                body {{
-                    font-family: Arial, sans-serif;
-                    margin: 40px;
-                    line-height: 1.6;
-                    background: #f5f5f5;
-                }}
-                .container {{
-                    max-width: 1400px;
-                    margin: 0 auto;
-                    background: white;
-                    padding: 30px;
-                    border-radius: 8px;
-                    box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-                }}
-                .header {{
-                    background: #2c3e50;
-                    color: white;
-                    padding: 20px;
-                    border-radius: 5px;
-                    margin-bottom: 30px;
-                }}
-                .menu {{
-                    margin: 20px 0;
-                }}
-                .menu a {{
-                    display: inline-block;
-                    margin-right: 15px;
-                    padding: 10px 20px;
-                    background: #3498db;
-                    color: white;
-                    text-decoration: none;
-                    border-radius: 3px;
-                }}
-                .menu a:hover {{
-                    background: #2980b9;
-                }}
-                table {{
-                    width: 100%;
-                    border-collapse: collapse;
-                    margin-top: 20px;
-                    font-family: monospace;
-                }}
-                th, td {{
-                    padding: 12px;
-                    text-align: center;
-                    border-bottom: 1px solid #ddd;
-                    font-family: monospace !important;
-                    vertical-align: top;
-                }}
-                th {{
-                    background: #f8f9fa;
-                    font-weight: bold;
-                    font-family: monospace !important;
-                    text-align: center;
-                }}
-                tr:hover {{
-                    background: #f8f9fa;
-                }}
-                .monospace-cell {{
-                    font-family: monospace !important;
-                    text-align: center;
-                    padding: 4px 6px;
-                    border: 1px solid #eee;
-                    border-radius: 3px;
-                    background: transparent;
-                    line-height: 1.4;
-                    overflow: hidden;
-                    text-overflow: ellipsis;
-                    white-space: nowrap;
-                    word-break: keep-all;
-                }}
-                .space {{
-                    color: #aaa;
-                    opacity: 0.7;
-                    font-weight: bold;
-                    background: rgba(255, 255, 255, 0.6);
-                    padding: 0 1px;
-                    border-radius: 2px;
-                    font-size: 0.9em;
-                }}
-                .create-button {{
-                    background: #28a745;
-                    color: white;
-                    padding: 10px 20px;
-                    text-decoration: none;
-                    border-radius: 3px;
-                    display: inline-block;
-                }}
-                .create-button:hover {{
-                    background: #218838;
-                }}
-                .export-btn {{
-                    background: #17a2b8 !important;
-                }}
-                .schedule-export-btn {{
-                    background: #6f42c1 !important;
-                }}
-                .warning {{
-                    background: #fff3cd;
-                    padding: 15px;
-                    border-radius: 5px;
-                    margin: 15px 0;
-                    border: 1px solid #ffeaa7;
-                }}
-                .success {{
-                    background: #d4edda;
-                    padding: 15px;
-                    border-radius: 5px;
-                    margin: 15px 0;
-                    border: 1px solid #c3e6cb;
-                }}
-            </style>
+            <link rel="stylesheet" href=\""""
+_LIST_PAGE_MENU = """">
         </head>
         <body>
-            <div class="container">
+            <div class="container container--wide">
                 <div class="header">
                     <h1>Таблица корректировок</h1>
-                    <p>Все текстовые поля отображаются в моноширинном шрифте. Пробелы отмечены как <span style="font-family: monospace; color: #aaa;">·</span></p>
+                    <p>Все текстовые поля отображаются в моноширинном шрифте. Пробелы отмечены как <span class="space-legend">·</span></p>
                 </div>
 
                 <div class="menu">
@@ -292,7 +161,10 @@ class CorrectionListView(View):
                     <a href="/export/schedule/" class="schedule-export-btn">Экспорт расписания</a>
                 </div>
 
-                {f"<div class='success'><strong>Готово к экспорту:</strong> Расписание загружено (стили сохранены)</div>" if has_uploaded_schedule else "<div class='warning'><strong>Внимание:</strong> Загрузите файл в формате <code>.xlsx</code>, чтобы экспортировать расписание с корректировками и стилями.</div>"}
+                """
+_LIST_PAGE_SCHEDULE_READY = "<div class='success'><strong>Готово к экспорту:</strong> Расписание загружено</div>"
+_LIST_PAGE_SCHEDULE_MISSING = "<div class='warning'><strong>Внимание:</strong> Загрузите файл в формате <code>.xlsx</code>, чтобы экспортировать расписание с корректировками и стилями.</div>"
+_LIST_PAGE_TABLE = """
 
                 <table>
                     <thead>
@@ -306,64 +178,161 @@ class CorrectionListView(View):
                         </tr>
                     </thead>
                     <tbody>
-                        {table_rows}
+                        """
+_LIST_PAGE_FOOTER = """
                     </tbody>
                 </table>
             </div>
         </body>
         </html>
         """
-        return HttpResponse(html_content, content_type="text/html; charset=utf-8")
 
-    def get_status_color(self, status):
-        if status == Correction.STATUS_PENDING:
-            return "background-color: #fff9c4; color: #000;"
-        elif status == Correction.STATUS_APPROVED:
-            return "background-color: #e8f5e9; color: #000;"
-        elif status == Correction.STATUS_INVALID:
-            return "background-color: #ffcdd2; color: #000;"
-        return ""
 
+class CorrectionListView(View):
+    # CSS-класс строки таблицы по статусу корректировки (цвета — в app.css)
+    STATUS_CLASS = {
+        Correction.STATUS_PENDING: "status-pending",
+        Correction.STATUS_APPROVED: "status-approved",
+        Correction.STATUS_INVALID: "status-invalid",
+    }
+
+    @method_decorator(gzip_page)
+    def get(self, request):
+        rows_key = f'corrections_rows:{_corrections_state()}'
+        table_rows = cache.get(rows_key)
+        has_uploaded_schedule = _has_uploaded_schedule(request)
+        app_css_url = static('corrections/app.css')
+        banner = _LIST_PAGE_SCHEDULE_READY if has_uploaded_schedule else _LIST_PAGE_SCHEDULE_MISSING
+        return StreamingHttpResponse(
+            self._stream_page(app_css_url, banner, rows_key, table_rows),
+            content_type="text/html; charset=utf-8",
+        )
+
+    def _stream_page(self, app_css_url: str, banner: str, rows_key: str, table_rows):
+        """
+        Страница частями: шапка уходит клиенту до того, как готовы строки таблицы.
+        Без кэша строки отдаются по мере рендера и после этого кладутся в кэш
+        """
+        yield _LIST_PAGE_HEAD
+        yield app_css_url
+        yield _LIST_PAGE_MENU
+        yield banner
+        yield _LIST_PAGE_TABLE
+        if table_rows is None:
+            rows = []
+            for row in self.iter_rows():
+                rows.append(row)
+                yield row
+            cache.set(rows_key, "".join(rows), CORRECTIONS_CACHE_TIMEOUT)
+        else:
+            yield table_rows
+        yield _LIST_PAGE_FOOTER
+
+    def iter_rows(self):
+        """HTML строк таблицы по одной"""
+        # Строки values() вместо экземпляров; гипотезы — вторым запросом на всю таблицу
+        corrections = list(
+            Correction.objects.order_by('-updated_at').values(
+                'id', 'subject__value', 'status', 'scope_id'
+            )
+        )
+        if corrections:
+            hypotheses_by_correction = _hypothesis_values_by_correction(
+                [correction['id'] for correction in corrections]
+            )
+            status_classes = self.STATUS_CLASS
+            for correction in corrections:
+                status_display = STATUS_DISPLAY.get(correction['status'], correction['status'])
+                status_class = status_classes.get(correction['status'], "")
+                subject = correction['subject__value']
+                subject_value = _highlight_spaces(subject)
+                hyps = hypotheses_by_correction.get(correction['id'], ())
+                hypotheses_title = html.escape(', '.join(hyps)) or '—'
+                hypotheses = ', '.join(_highlight_spaces(value) for value in hyps)
+                if not hypotheses:
+                    hypotheses = "—"
+                yield f"""
+                <tr class="{status_class}">
+                    <td>{correction['id']}</td>
+                    <td>
+                        <div class="monospace-cell" title="{html.escape(subject)}">
+                            {subject_value}
+                        </div>
+                    </td>
+                    <td>{status_display}</td>
+                    <td>
+                        <div class="monospace-cell" title="{hypotheses_title}">
+                            {hypotheses}
+                        </div>
+                    </td>
+                    <td>{correction['scope_id']}</td>
+                    <td>
+                        <a href="/admin/corrections/correction/{correction['id']}/change/" class="edit-link">Редактировать</a>
+                    </td>
+                </tr>
+                """
+        else:
+            yield """
+            <tr>
+                <td colspan="6" class="empty-row">
+                    Нет корректировок. Создайте их через админ-панель.
+                </td>
+            </tr>
+            """
 
-def upload_schedule(request):
-    global last_uploaded_file_path
 
+def upload_schedule(request):
     if request.method == 'POST' and request.FILES.get('schedule_file'):
         uploaded_file = request.FILES['schedule_file']
         filename = uploaded_file.name.lower()
 
         if not filename.endswith('.xlsx'):
-            return HttpResponse(
-                "❌ Ошибка: поддерживается только формат <strong>.xlsx</strong> (Excel 2007 и новее).<br>"
-                "Сохраните ваш файл как «Книга Excel (.xlsx)» в Microsoft Excel или LibreOffice и загрузите заново.",
-                content_type="text/html; charset=utf-8"
-            )
+            # 400, чтобы клиент отличал отказ от успешной загрузки
+            return render(request, 'corrections/upload_error.html', status=400)
+
+        # Предыдущий файл этой сессии больше не нужен
+        _forget_uploaded_schedule(request)
 
         try:
             with tempfile.NamedTemporaryFile(delete=False, suffix='.xlsx') as tmp:
-                for chunk in uploaded_file.chunks():
-                    tmp.write(chunk)
-                last_uploaded_file_path = tmp.name
-
-            wb_preview = load_workbook(last_uploaded_file_path, read_only=True, data_only=True)
-            ws_preview = wb_preview.active
-            rows = list(ws_preview.iter_rows(values_only=True))
-            row_count = len(rows)
-            col_count = max(len(row) for row in rows) if rows else 0
-            wb_preview.close()
-
+                # Блоками по 1 МБ вместо цикла по 64-КБ chunks()
+                shutil.copyfileobj(uploaded_file, tmp, length=UPLOAD_COPY_BUFFER_SIZE)
+            request.session[SCHEDULE_SESSION_KEY] = tmp.name
+
+            wb_preview = load_workbook(tmp.name, read_only=True, data_only=True)
+            try:
+                ws_preview = wb_preview.active
+                # Считаем потоково: max_row/max_column в read-only режиме берутся
+                # из тега <dimension> и бывают неверны, а весь лист в памяти не нужен
+                # calamine читает быстрее, но держит весь диапазон листа в памяти
+                # и считает строки от первой непустой ячейки — остаёмся на openpyxl
+                row_count = 0
+                col_count = 0
+                for row in ws_preview.iter_rows(values_only=True):
+                    row_count += 1
+                    if len(row) > col_count:
+                        col_count = len(row)
+            finally:
+                # read-only книга держит zip-файл открытым до close()
+                wb_preview.close()
+
+            if _uses_streaming_export(tmp.name):
+                styles_note = (
+                    "<p class='note'><strong>⚠ Файл большой:</strong> экспорт пройдёт потоково, "
+                    "стили (цвета, шрифты, границы) и объединённые ячейки не сохранятся.</p>"
+                )
+            else:
+                styles_note = (
+                    "<p class='note note-success'><strong>✅ Все стили (цвета, шрифты, границы) "
+                    "сохранены!</strong></p>"
+                )
+            app_css_url = static('corrections/app.css')
             html_content = f"""
             <!DOCTYPE html>
             <html>
             <head>
                 <title>Результат загрузки</title>
-                <style>
-                    body {{ font-family: Arial; margin: 40px; background: #f5f5f5; }}
-                    .container {{ max-width: 1200px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }}
-                    .header {{ background: #2c3e50; color: white; padding: 20px; border-radius: 5px; margin-bottom: 30px; }}
-                    .success {{ background: #d4edda; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                    .info-box {{ background: #e8f4fd; padding: 15px; border-radius: 5px; margin: 15px 0; }}
-                </style>
+                <link rel="stylesheet" href="{app_css_url}">
             </head>
             <body>
                 <div class="container">
@@ -371,20 +340,20 @@ def upload_schedule(request):
                         <h1>✅ Файл успешно загружен!</h1>
                     </div>
                     <div class="success">
-                        <p><strong>Имя файла:</strong> {uploaded_file.name}</p>
+                        <p><strong>Имя файла:</strong> {html.escape(uploaded_file.name)}</p>
                         <p><strong>Формат:</strong> .xlsx</p>
                         <p><strong>Строк:</strong> {row_count}</p>
                         <p><strong>Колонок:</strong> {col_count}</p>
-                        <p style="color: #155724;"><strong>✅ Все стили (цвета, шрифты, границы) сохранены!</strong></p>
+                        {styles_note}
                     </div>
-                    <div style="margin-top: 20px;">
-                        <a href="/upload/" style="background: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 3px;">
+                    <div class="actions">
+                        <a href="/upload/" class="button">
                             Загрузить другой файл
                         </a>
-                        <a href="/corrections/" style="background: #28a745; color: white; padding: 10px 20px; text-decoration: none; border-radius: 3px; margin-left: 10px;">
+                        <a href="/corrections/" class="button button--green">
                             Перейти к корректировкам
                         </a>
-                        <a href="/export/schedule/" style="background: #6f42c1; color: white; padding: 10px 20px; text-decoration: none; border-radius: 3px; margin-left: 10px;">
+                        <a href="/export/schedule/" class="button button--purple">
                             Экспорт исправленного расписания
                         </a>
                     </div>
@@ -395,147 +364,70 @@ def upload_schedule(request):
             return HttpResponse(html_content, content_type="text/html; charset=utf-8")
 
         except Exception as e:
-            if last_uploaded_file_path and os.path.exists(last_uploaded_file_path):
-                os.unlink(last_uploaded_file_path)
-            last_uploaded_file_path = None
+            _forget_uploaded_schedule(request)
             return HttpResponse(f"Ошибка при обработке файла: {str(e)}")
 
-    csrf_token = get_token(request)
-    html_content = f"""
-    <!DOCTYPE html>
-    <html>
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>Загрузка расписания</title>
-        <style>
-            body {{
-                font-family: Arial, sans-serif;
-                margin: 40px;
-                line-height: 1.6;
-                background: #f5f5f5;
-            }}
-            .container {{
-                max-width: 800px;
-                margin: 0 auto;
-                background: white;
-                padding: 30px;
-                border-radius: 8px;
-                box-shadow: 0 2px 10px rgba(0,0,0,0.1);
-            }}
-            .header {{
-                background: #2c3e50;
-                color: white;
-                padding: 20px;
-                border-radius: 5px;
-                margin-bottom: 30px;
-            }}
-            .upload-form {{
-                background: #e8f4fd;
-                padding: 25px;
-                border-radius: 8px;
-                border: 2px dashed #3498db;
-                text-align: center;
-            }}
-            .file-input {{
-                margin: 20px 0;
-            }}
-            .submit-btn {{
-                background: #3498db;
-                color: white;
-                padding: 12px 30px;
-                border: none;
-                border-radius: 5px;
-                font-size: 16px;
-                cursor: pointer;
-            }}
-            .submit-btn:hover {{
-                background: #2980b9;
-            }}
-            .info {{
-                background: #fff3cd;
-                padding: 15px;
-                border-radius: 5px;
-                margin-top: 20px;
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>Загрузка файла расписания</h1>
-                <p>Только <strong>.xlsx</strong> (Excel 2007+)</p>
-            </div>
-            <div class="upload-form">
-                <form method="post" enctype="multipart/form-data">
-                    <input type="hidden" name="csrfmiddlewaretoken" value="{csrf_token}">
-                    <h3>Выберите файл Excel (.xlsx)</h3>
-                    <div class="file-input">
-                        <input type="file" name="schedule_file" accept=".xlsx" required style="font-size: 16px; padding: 10px;">
-                    </div>
-                    <button type="submit" class="submit-btn">Загрузить</button>
-                </form>
-            </div>
-            <div class="info">
-                <h4>Важно:</h4>
-                <p>Поддерживается <strong>только формат .xlsx</strong>.</p>
-                <p>При экспорте будут сохранены все стили: цвета, шрифты, границы и объединённые ячейки.</p>
-            </div>
-            <div style="text-align: center; margin-top: 20px;">
-                <a href="/" style="color: #3498db; text-decoration: none;">← На главную</a>
-            </div>
-        </div>
-    </body>
-    </html>
-    """
-    return HttpResponse(html_content, content_type="text/html; charset=utf-8")
+    return render(request, 'corrections/upload.html', _streaming_export_context())
 
 
-def apply_correction(subject: Item, hypotheses: List[Item], scope_id: int = 0) -> Item:
-    from django.db.models import Q
+def _best_by_score(items):
+    """Гипотеза с наибольшим score; без score — в конце, как ORDER BY score DESC в SQLite"""
+    return max(items, key=lambda h: (h.score is not None, h.score or 0), default=None)
 
-    corrections = Correction.objects.filter(
+
+def apply_correction(subject: Item, hypotheses: List[Item], scope_id: int = 0) -> Item:
+    # Одна выборка вместо exists() + first(); гипотезы подгружаются вместе с корректировкой
+    correction = Correction.objects.filter(
         subject__value=subject.value,
         scope_id=scope_id
-    ).select_related('subject').prefetch_related('hypotheses', 'subject__context')
+    ).select_related('subject').prefetch_related('hypotheses').first()
 
-    if not corrections.exists():
+    if correction is None:
         if hypotheses:
             return max(hypotheses, key=lambda h: h.score)
         return subject
 
-    correction = corrections.first()
+    # Лучшие гипотезы выбираются из подгруженного списка, без запросов order_by().first()
+    current_hypotheses = list(correction.hypotheses.all())
 
     if correction.status == Correction.STATUS_APPROVED:
-        approved_hyp = correction.hypotheses.filter(approved=True).first()
+        approved_hyp = _best_by_score(h for h in current_hypotheses if h.approved)
         current_score = approved_hyp.score if approved_hyp else -float('inf')
         new_better_hypotheses = [h for h in hypotheses if h.score > current_score]
         if new_better_hypotheses:
-            for hyp in new_better_hypotheses:
-                correction.hypotheses.add(hyp)
-            correction.status = Correction.STATUS_PENDING
-            correction.save()
+            # Записи ветки (add, save с проверкой score) — одной транзакцией,
+            # а не отдельным коммитом на каждый запрос; так же в ветках ниже
+            with transaction.atomic():
+                correction.hypotheses.add(*new_better_hypotheses)
+                correction.status = Correction.STATUS_PENDING
+                correction.save(update_fields=['status', 'updated_at'])
         if approved_hyp:
             return approved_hyp
-        best_in_correction = correction.hypotheses.order_by('-score').first()
+        best_in_correction = _best_by_score(current_hypotheses + new_better_hypotheses)
         return best_in_correction or subject
 
     elif correction.status == Correction.STATUS_PENDING:
-        for hyp in hypotheses:
-            correction.hypotheses.add(hyp)
-        correction.save()
-        best = correction.hypotheses.order_by('-score').first()
+        if hypotheses:
+            with transaction.atomic():
+                correction.hypotheses.add(*hypotheses)
+                correction.save(update_fields=['updated_at'])
+        else:
+            # save() не нужен, но проверку уникальности score, которую он делал,
+            # сохраняем
+            correction._ensure_unique_scores()
+        best = _best_by_score(current_hypotheses + list(hypotheses))
         return best or subject
 
     elif correction.status == Correction.STATUS_INVALID:
-        for hyp in correction.hypotheses.filter(suggested_by_reviewer=True):
-            hyp.score = 0
-            hyp.approved = False
-            hyp.save()
-        for hyp in hypotheses:
-            correction.hypotheses.add(hyp)
-        correction.status = Correction.STATUS_PENDING
-        correction.save()
+        with transaction.atomic():
+            # Один UPDATE вместо save() каждой гипотезы
+            correction.hypotheses.filter(suggested_by_reviewer=True).update(score=0, approved=False)
+            # update() не трогает подгруженные гипотезы — сбрасываем prefetch-кэш
+            correction._prefetched_objects_cache.pop('hypotheses', None)
+            if hypotheses:
+                correction.hypotheses.add(*hypotheses)
+            correction.status = Correction.STATUS_PENDING
+            correction.save(update_fields=['status', 'updated_at'])
         if hypotheses:
             return max(hypotheses, key=lambda h: h.score)
         return subject
@@ -552,7 +444,7 @@ def get_approved_correction_for_subject(subject_value: str, scope_id: int = 0) -
         ).select_related('subject').prefetch_related('hypotheses').first()
 
         if correction:
-            approved_hyp = correction.hypotheses.filter(approved=True).first()
+            approved_hyp = correction.hypotheses.filter(approved=True).order_by('-score').first()
             if approved_hyp:
                 return approved_hyp.value
     except Exception:
@@ -560,118 +452,224 @@ def get_approved_correction_for_subject(subject_value: str, scope_id: int = 0) -
     return subject_value
 
 
-def export_schedule_with_corrections(request):
-    global last_uploaded_file_path
+def _approved_corrections_lookup(scope_id: int = 0) -> dict:
+    """
+    Все подтверждённые корректировки scope одним проходом: subject.value -> значение
+    подтверждённой гипотезы. Повторяет выбор get_approved_correction_for_subject:
+    побеждает последняя обновлённая корректировка; если у неё нет подтверждённой
+    гипотезы, предмета в словаре нет.
+    """
+    corrections = Correction.objects.filter(
+        scope_id=scope_id,
+        status=Correction.STATUS_APPROVED
+    ).select_related('subject').prefetch_related(
+        Prefetch('hypotheses', queryset=Item.objects.filter(approved=True).order_by('-score'))
+    ).order_by('-updated_at')
 
-    if not last_uploaded_file_path or not os.path.exists(last_uploaded_file_path):
-        html_content = """
-        <!DOCTYPE html>
-        <html>
-        <head>
-            <title>Ошибка экспорта</title>
-            <style>
-                body { font-family: Arial; margin: 40px; background: #f5f5f5; }
-                .container { max-width: 800px; margin: 0 auto; background: white; padding: 30px; border-radius: 8px; }
-                .header { background: #dc3545; color: white; padding: 20px; border-radius: 5px; margin-bottom: 30px; }
-                .error { background: #f8d7da; padding: 15px; border-radius: 5px; margin: 15px 0; }
-            </style>
-        </head>
-        <body>
-            <div class="container">
-                <div class="header">
-                    <h1>❌ Ошибка экспорта</h1>
-                </div>
-                <div class="error">
-                    <h3>Расписание не загружено</h3>
-                    <p>Сначала загрузите файл в формате <strong>.xlsx</strong>.</p>
-                </div>
-                <div style="margin-top: 20px;">
-                    <a href="/upload/" style="background: #3498db; color: white; padding: 10px 20px; text-decoration: none; border-radius: 3px;">
-                        Перейти к загрузке
-                    </a>
-                    <a href="/" style="background: #6c757d; color: white; padding: 10px 20px; text-decoration: none; border-radius: 3px; margin-left: 10px;">
-                        На главную
-                    </a>
-                </div>
-            </div>
-        </body>
-        </html>
-        """
-        return HttpResponse(html_content, content_type="text/html; charset=utf-8")
+    lookup = {}
+    for correction in corrections:
+        if correction.subject.value in lookup:
+            continue
+        approved_hyp = next(iter(correction.hypotheses.all()), None)
+        lookup[correction.subject.value] = approved_hyp.value if approved_hyp else None
+    return {subject: value for subject, value in lookup.items() if value is not None}
+
+
+def _resolve_replacement(value: str, lookup: dict, resolved: dict):
+    """
+    Замена для строки ячейки по lookup (None — менять не нужно). Результат
+    запоминается в resolved: одинаковые названия предметов повторяются по всему
+    расписанию, strip() и поиск делаем раз на строку.
+    """
+    original_value = value.strip()
+    corrected_value = lookup.get(original_value) if original_value else None
+    # Записываем только реальные замены: присваивание value не бесплатно
+    if corrected_value == value:
+        corrected_value = None
+    resolved[value] = corrected_value
+    return corrected_value
+
+
+def _rewrite_sheet(ws, lookup: dict, resolved: dict) -> None:
+    """Заменяет значения ячеек листа по lookup на месте, стили не трогаются"""
+    # Только существующие ячейки. Публичный iter_rows() создаёт Cell для каждой
+    # пустой позиции прямоугольника листа, и они попадают в сохранённый файл,
+    # поэтому читаем приватный ws._cells (копия — на случай изменения словаря)
+    for cell in list(ws._cells.values()):
+        value = cell.value
+        if not isinstance(value, str):
+            continue
+        try:
+            corrected_value = resolved[value]
+        except KeyError:
+            corrected_value = _resolve_replacement(value, lookup, resolved)
+        if corrected_value is not None:
+            cell.value = corrected_value
+
+
+def _stream_rewrite_workbook(path: str, lookup: dict, output) -> None:
+    """
+    Потоковый экспорт для больших файлов: read-only чтение и write-only запись
+    по строке, память O(строки). Сохраняются листы, значения и формулы;
+    стили, ширины колонок и объединения ячеек теряются.
+    """
+    src = load_workbook(path, read_only=True)
+    try:
+        dst = Workbook(write_only=True)
+        resolved = {}
+        for src_ws in src.worksheets:
+            dst_ws = dst.create_sheet(src_ws.title)
+            for row in src_ws.iter_rows(values_only=True):
+                row = list(row)
+                for i, value in enumerate(row):
+                    if not isinstance(value, str):
+                        continue
+                    try:
+                        corrected_value = resolved[value]
+                    except KeyError:
+                        corrected_value = _resolve_replacement(value, lookup, resolved)
+                    if corrected_value is not None:
+                        row[i] = corrected_value
+                dst_ws.append(row)
+        dst.save(output)
+    finally:
+        src.close()
+
+
+def export_schedule_with_corrections(request):
+    uploaded_path = request.session.get(SCHEDULE_SESSION_KEY)
+    if not uploaded_path or not os.path.exists(uploaded_path):
+        return render(request, 'corrections/export_error.html')
 
     output = BytesIO()
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f'schedule_corrected_{timestamp}.xlsx'
 
     try:
-        wb = load_workbook(last_uploaded_file_path)
-        for ws in wb.worksheets:
-            for row in ws.iter_rows():
-                for cell in row:
-                    if cell.value is not None and isinstance(cell.value, str):
-                        original_value = str(cell.value).strip()
-                        corrected_value = get_approved_correction_for_subject(original_value, scope_id=0)
-                        cell.value = corrected_value
-
-        wb.save(output)
+        # Корректировки загружаются один раз, а не запросом на каждую ячейку
+        # Словарь замен общий для всех сессий: повторные экспорты его не пересобирают
+        lookup = cache.get_or_set(
+            f'approved_lookup:0:{_corrections_state()}',
+            lambda: _approved_corrections_lookup(scope_id=0),
+            CORRECTIONS_CACHE_TIMEOUT,
+        )
+        if not lookup:
+            # Заменять нечего — отдаём загруженный файл как есть, без разбора книги.
+            # Копия в памяти, а не открытый файл: ниже он удаляется вместе с сессией
+            with open(uploaded_path, 'rb') as src:
+                shutil.copyfileobj(src, output, length=UPLOAD_COPY_BUFFER_SIZE)
+        elif _uses_streaming_export(uploaded_path):
+            _stream_rewrite_workbook(uploaded_path, lookup, output)
+        else:
+            # Полная загрузка нужна, чтобы сохранить стили; VBA и rich text не разбираем
+            wb = load_workbook(uploaded_path, keep_vba=False, rich_text=False)
+            # Исходная строка ячейки -> замена, общая для всех листов
+            resolved = {}
+            try:
+                for ws in wb.worksheets:
+                    _rewrite_sheet(ws, lookup, resolved)
+
+                wb.save(output)
+            finally:
+                wb.close()
 
     finally:
-        if last_uploaded_file_path and os.path.exists(last_uploaded_file_path):
-            os.unlink(last_uploaded_file_path)
-        last_uploaded_file_path = None
+        _forget_uploaded_schedule(request)
 
     output.seek(0)
-    response = HttpResponse(
-        output.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    return response
+    # FileResponse отдаёт буфер частями, без копии getvalue()
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)
+
+
+def _plain_string_cell(ws, value):
+    """Строка с '=' в начале — текст, а не формула, как и в xlsxwriter-версии"""
+    if not isinstance(value, str) or not value.startswith('='):
+        return value
+    cell = WriteOnlyCell(ws, value=value)
+    cell.data_type = 's'
+    return cell
+
+
+def _write_corrections_openpyxl(output, rows: list, widths: list) -> None:
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(CORRECTIONS_EXPORT_SHEET)
+    for i, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+    ws.append(CORRECTIONS_EXPORT_COLUMNS)
+    for row in rows:
+        ws.append([_plain_string_cell(ws, value) for value in row])
+    wb.save(output)
+
+
+def _write_corrections_xlsxwriter(output, rows: list, widths: list) -> None:
+    """Тот же лист через xlsxwriter: запись таблицы заметно быстрее openpyxl"""
+    # Значения пишутся как есть: без автоссылок (у них лимиты длины и числа на лист)
+    # и без формул из строк с '=' — так же, как в openpyxl-версии
+    wb = xlsxwriter.Workbook(output, {
+        'in_memory': True,
+        'strings_to_urls': False,
+        'strings_to_formulas': False,
+    })
+    ws = wb.add_worksheet(CORRECTIONS_EXPORT_SHEET)
+    for i, width in enumerate(widths):
+        ws.set_column(i, i, width)
+    ws.write_row(0, 0, CORRECTIONS_EXPORT_COLUMNS)
+    for row_index, row in enumerate(rows, 1):
+        ws.write_row(row_index, 0, row)
+    wb.close()
 
 
 def export_corrections(request):
-    import pandas as pd
-    corrections = Correction.objects.all().select_related('subject').prefetch_related('hypotheses', 'subject__context')
-    data = []
+    # Строки values(); гипотезы и контекст subject — по одному запросу на весь экспорт
+    corrections = list(Correction.objects.values(
+        'id', 'subject_id', 'subject__value', 'status', 'scope_id', 'created_at', 'updated_at'
+    ))
+    hypotheses_by_correction = _hypothesis_values_by_correction(
+        [correction['id'] for correction in corrections]
+    )
+    context_by_subject = defaultdict(list)
+    context_rows = Item.context.through.objects.filter(
+        item_id__in={correction['subject_id'] for correction in corrections}
+    ).values_list('item_id', 'contextelement__key', 'contextelement__value')
+    for item_id, key, value in context_rows:
+        context_by_subject[item_id].append(f"{key}:{value}")
+
+    rows = []
     for correction in corrections:
-        hypotheses = ', '.join([h.value for h in correction.hypotheses.all()])
+        hypotheses = ', '.join(hypotheses_by_correction.get(correction['id'], ()))
         if not hypotheses:
             hypotheses = "—"
-        context = ', '.join([f"{ctx.key}:{ctx.value}" for ctx in correction.subject.context.all()])
+        context = ', '.join(context_by_subject.get(correction['subject_id'], ()))
         if not context:
             context = "—"
-        data.append({
-            'ID': correction.id,
-            'Исходный_предмет': correction.subject.value,
-            'Статус': correction.get_status_display(),
-            'Гипотезы': hypotheses,
-            'Контекст': context,
-            'Scope': correction.scope_id,
-            'Создано': correction.created_at.strftime('%Y-%m-%d %H:%M'),
-            'Обновлено': correction.updated_at.strftime('%Y-%m-%d %H:%M')
-        })
-    df = pd.DataFrame(data)
+        rows.append([
+            correction['id'],
+            correction['subject__value'],
+            STATUS_DISPLAY.get(correction['status'], correction['status']),
+            hypotheses,
+            context,
+            correction['scope_id'],
+            # '%Y-%m-%d %H:%M' без strftime: срез isoformat в ~3 раза быстрее
+            correction['created_at'].isoformat(' ', 'minutes')[:16],
+            correction['updated_at'].isoformat(' ', 'minutes')[:16],
+        ])
+
+    # Ширина колонок считается по данным заранее: в write_only-книге размеры
+    # колонок должны быть заданы до первой строки
+    columns = list(zip(*rows)) or [()] * len(CORRECTIONS_EXPORT_COLUMNS)
+    widths = [
+        max(len(name), max(map(len, map(str, column)), default=0))
+        for name, column in zip(CORRECTIONS_EXPORT_COLUMNS, columns)
+    ]
+
+    widths = [min(width + 2, 50) for width in widths]
+
     output = BytesIO()
-    with pd.ExcelWriter(output, engine='openpyxl') as writer:
-        df.to_excel(writer, sheet_name='Корректировки', index=False)
-        worksheet = writer.sheets['Корректировки']
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+    if xlsxwriter is not None:
+        _write_corrections_xlsxwriter(output, rows, widths)
+    else:
+        _write_corrections_openpyxl(output, rows, widths)
     output.seek(0)
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
     filename = f'corrections_export_{timestamp}.xlsx'
-    response = HttpResponse(
-        output.getvalue(),
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    )
-    response['Content-Disposition'] = f'attachment; filename={filename}'
-    return response
+    return FileResponse(output, as_attachment=True, filename=filename, content_type=XLSX_CONTENT_TYPE)